@@ -1,18 +1,21 @@
 import os
 import re
+import json
+import time
+import asyncio
 import pandas as pd
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from sentence_transformers import SentenceTransformer
+import asyncpg
+import cachetools
 from dotenv import load_dotenv
 import google.generativeai as genai
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, List, Any
-from functools import lru_cache
-import sqlparse
+from typing import Optional, Dict, List, Any, Tuple
+from contextlib import asynccontextmanager
 import logging
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 logging.basicConfig(level=logging.INFO, filename='query_api.log', filemode='a',
                     format='%(asctime)s - %(levelname)s - %(message)s')
@@ -29,8 +32,14 @@ DB_CONFIG = {
     'database': os.getenv('DB_NAME', 'llm_query_db'),
     'user': os.getenv('DB_USER', 'postgres'),
     'password': os.getenv('DB_PASSWORD'),
-    'port': os.getenv('DB_PORT', '5432')
+    'port': int(os.getenv('DB_PORT', '5432'))
 }
+# Per API worker process: every worker opens its own pool, so keep the total well below
+# Postgres' max_connections (default 100) to leave room for imports and psql sessions
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 2))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+# Idle pooled connections are closed after this many seconds, before server or firewall timeouts kill them
+DB_POOL_MAX_IDLE = 60.0
 
 try:
     genai.configure(api_key=API_KEY)
@@ -38,12 +47,30 @@ except Exception as e:
     logger.error(f"Failed to configure Gemini API: {str(e)}")
     raise ValueError(f"Failed to configure Gemini API: {str(e)}")
 
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+# Built once; temperature 0 keeps the generated SQL deterministic for repeated questions.
+# The response schema makes Gemini return {"sql": "..."} with no markdown to strip.
+_GEMINI_MODEL = genai.GenerativeModel(
+    'gemini-2.0-flash',
+    generation_config={
+        'temperature': 0,
+        'max_output_tokens': 512,
+        'response_mime_type': 'application/json',
+        'response_schema': {
+            'type': 'object',
+            'properties': {'sql': {'type': 'string'}},
+            'required': ['sql']
+        }
+    }
+)
+
+# Small responses (health checks, errors) are not worth compressing
+GZIP_MINIMUM_SIZE = 1024
 
 app = FastAPI(
     title="Normalized CRM Query API",
     description="Natural language SQL with proper JOIN handling for normalized Personnel/Companies schema",
-    version="4.0.0"
+    version="4.0.0",
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -53,6 +80,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
 
 class QueryRequest(BaseModel):
     question: str
@@ -62,91 +90,192 @@ class QueryRequest(BaseModel):
 class QueryResponse(BaseModel):
     success: bool
     question: str
-    results: List[Dict[str, Any]]
+    # Rows are built by format_results_intelligently; Any skips re-validating every cell
+    results: List[Any]
     sql_query: Optional[str] = None
     raw_data: Optional[str] = None
     error: Optional[str] = None
     tables_used: Optional[List[str]] = None
 
 class DatabaseInfo(BaseModel):
-    tables: Dict[str, dict]
+    tables: Dict[str, Any]
     total_records: int
 
-def get_db_connection():
+@app.on_event("startup")
+async def open_db_pool():
+    try:
+        app.state.pool = await asyncpg.create_pool(
+            min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+            max_inactive_connection_lifetime=DB_POOL_MAX_IDLE, **DB_CONFIG
+        )
+    except Exception as e:
+        logger.error(f"Database pool creation failed: {str(e)}")
+        raise
+
+@app.on_event("shutdown")
+async def close_db_pool():
+    await app.state.pool.close()
+
+@asynccontextmanager
+async def get_db_connection():
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        return conn
+        # No ping on checkout: asyncpg discards connections that broke, and idle ones are
+        # recycled after DB_POOL_MAX_IDLE, so a health check would only add a round trip per query
+        conn = await app.state.pool.acquire()
     except Exception as e:
         logger.error(f"Database connection failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database connection failed: {str(e)}")
+    try:
+        yield conn
+    finally:
+        await app.state.pool.release(conn)
+
+SCHEMA_CACHE_TTL = 30.0
+SCHEMA_CACHE_REFRESH_AHEAD = 5.0
+# Raised by Postgres when the cached schema is stale
+SCHEMA_CHANGED_SQLSTATES = {'42P01', '42703'}  # undefined_table, undefined_column
+
+class RefreshingTTLCache:
+    """Single-value async cache that reloads in the background as the TTL approaches.
+    version is bumped only when a reload returns a different value."""
+
+    def __init__(self, loader, ttl: float, refresh_ahead: float):
+        self.loader = loader
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.version = 0
+        self._value = None
+        self._fetched_at = None
+        self._lock = asyncio.Lock()
+        self._refresh_task = None
+
+    def _age(self) -> Optional[float]:
+        return None if self._fetched_at is None else time.monotonic() - self._fetched_at
+
+    async def get(self):
+        age = self._age()
+        if age is None or age > self.ttl:
+            return await self._load()
+        if age > self.ttl - self.refresh_ahead and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self._refresh())
+        return self._value
+
+    async def _load(self):
+        async with self._lock:
+            age = self._age()
+            if age is None or age > self.ttl:
+                self._store(await self.loader())
+            return self._value
+
+    async def _refresh(self):
+        try:
+            value = await self.loader()
+        except Exception as e:
+            logger.warning(f"Background cache refresh failed: {str(e)}")
+            return
+        self._store(value)
+
+    def _store(self, value):
+        # Keep the existing object when nothing changed so dependents can skip rebuilding
+        if value != self._value:
+            self._value = value
+            self.version += 1
+        self._fetched_at = time.monotonic()
+
+    def invalidate(self):
+        self._value = None
+        self._fetched_at = None
+
+async def discover_all_tables():
+    return await schema_cache.get()
+
+def clear_tables_cache():
+    global _SCHEMA_PROMPT_CACHE
+    schema_cache.invalidate()
+    _SCHEMA_PROMPT_CACHE = (-1, None)
+
+# Lowercased names of the tables from the last discovery, for tables_used detection
+_known_tables_lower: frozenset = frozenset()
+
+DISCOVERY_SCHEMA = 'public'
+HIDDEN_COLUMNS = ['created_at', 'updated_at']
+SAMPLE_COLUMNS_PER_TABLE = 10
+SAMPLE_VALUES_PER_COLUMN = 3
+
+def _quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def _quote_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+def _build_sample_query(tables_info: Dict[str, dict]) -> Optional[str]:
+    """One UNION ALL over every sampled (table, column) pair, with the sample size as $1"""
+    selects = []
+    for table, info in tables_info.items():
+        for col_name, _, _ in info['columns'][:SAMPLE_COLUMNS_PER_TABLE]:
+            col = _quote_ident(col_name)
+            selects.append(
+                f"(SELECT {_quote_literal(table)} AS t, {_quote_literal(col_name)} AS c, v "
+                f"FROM (SELECT DISTINCT {col}::text AS v FROM {_quote_ident(table)} "
+                f"WHERE {col} IS NOT NULL AND {col}::text != '' "
+                f"LIMIT $1) s)"
+            )
+    return "\nUNION ALL\n".join(selects) if selects else None
 
-@lru_cache(maxsize=1)
-def discover_all_tables():
+async def fetch_all_tables():
     logger.info("Discovering database tables")
-    conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT table_name 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public' 
-            AND table_name NOT LIKE 'pg_%'
-            AND table_type = 'BASE TABLE'
-            ORDER BY table_name
-        """)
-        tables = [row[0] for row in cursor.fetchall()]
-        tables_info = {}
-        for table in tables:
-            cursor.execute(f"""
-                SELECT column_name, data_type, is_nullable
-                FROM information_schema.columns 
-                WHERE table_name = '{table}' 
-                AND column_name NOT IN ('created_at', 'updated_at')
-                ORDER BY ordinal_position
-            """)
-            columns = cursor.fetchall()
-            cursor.execute(f"SELECT COUNT(*) FROM {table}")
-            record_count = cursor.fetchone()[0]
-            sample_data = {}
-            for col_name, data_type, _ in columns[:10]:
+        async with get_db_connection() as conn:
+            # reltuples is the planner's row estimate: no sequential scan per table.
+            # It is -1 until the table is first analyzed (e.g. right after import), so fall
+            # back to the statistics collector's live tuple count.
+            rows = await conn.fetch("""
+                SELECT c.table_name, c.column_name, c.data_type, c.is_nullable,
+                       (CASE WHEN pc.reltuples >= 0 THEN pc.reltuples
+                             ELSE COALESCE(st.n_live_tup, 0) END)::bigint AS record_count
+                FROM information_schema.tables t
+                JOIN information_schema.columns c
+                  ON c.table_schema = t.table_schema AND c.table_name = t.table_name
+                JOIN pg_class pc
+                  ON pc.oid = format('%I.%I', t.table_schema, t.table_name)::regclass
+                LEFT JOIN pg_stat_user_tables st ON st.relid = pc.oid
+                WHERE t.table_schema = $1
+                AND t.table_name NOT LIKE 'pg_%'
+                AND t.table_type = 'BASE TABLE'
+                AND c.column_name <> ALL($2::text[])
+                ORDER BY c.table_name, c.ordinal_position
+            """, DISCOVERY_SCHEMA, HIDDEN_COLUMNS)
+            tables_info = {}
+            for table, col_name, data_type, is_nullable, record_count in rows:
+                info = tables_info.setdefault(table, {
+                    'columns': [],
+                    'record_count': record_count,
+                    'sample_data': {}
+                })
+                info['columns'].append((col_name, data_type, is_nullable))
+            for info in tables_info.values():
+                for col_name, _, _ in info['columns'][:SAMPLE_COLUMNS_PER_TABLE]:
+                    info['sample_data'][col_name] = []
+
+            sample_query = _build_sample_query(tables_info)
+            if sample_query:
                 try:
-                    # Handle different data types for sample data query
-                    if data_type.lower() == 'boolean':
-                        # For boolean columns, just check NOT NULL
-                        cursor.execute(f"""
-                            SELECT DISTINCT {col_name} 
-                            FROM {table} 
-                            WHERE {col_name} IS NOT NULL 
-                            LIMIT 3
-                        """)
-                    else:
-                        # For text/other columns, exclude empty strings
-                        cursor.execute(f"""
-                            SELECT DISTINCT {col_name} 
-                            FROM {table} 
-                            WHERE {col_name} IS NOT NULL 
-                            AND {col_name}::text != '' 
-                            LIMIT 3
-                        """)
-                    examples = [str(row[0]) for row in cursor.fetchall()]
-                    sample_data[col_name] = examples
+                    # conn.fetch goes through the connection's statement cache (conn.prepare bypasses it),
+                    # so an unchanged schema -> same statement text -> no re-parse on refresh
+                    for table, col_name, value in await conn.fetch(sample_query, SAMPLE_VALUES_PER_COLUMN):
+                        tables_info[table]['sample_data'][col_name].append(value)
                 except Exception as e:
-                    logger.warning(f"Failed to fetch sample data for {table}.{col_name}: {str(e)}")
-                    sample_data[col_name] = []
-            tables_info[table] = {
-                'columns': columns,
-                'record_count': record_count,
-                'sample_data': sample_data
-            }
-        cursor.close()
-        conn.close()
-        logger.info(f"Discovered {len(tables)} tables")
+                    logger.warning(f"Failed to fetch sample data: {str(e)}")
+        global _known_tables_lower
+        _known_tables_lower = frozenset(table.lower() for table in tables_info)
+        logger.info(f"Discovered {len(tables_info)} tables")
         return tables_info
     except Exception as e:
-        conn.close()
         logger.error(f"Error discovering tables: {str(e)}")
         raise Exception(f"Error discovering tables: {str(e)}")
 
+schema_cache = RefreshingTTLCache(fetch_all_tables, SCHEMA_CACHE_TTL, SCHEMA_CACHE_REFRESH_AHEAD)
+
 # NORMALIZED SCHEMA DEFINITIONS
 TABLE_COLUMN_DEFINITIONS = {
     'unified_personnel': {
@@ -212,12 +341,7 @@ TABLE_COLUMN_DEFINITIONS = {
     }
 }
 
-def build_dynamic_system_prompt(user_question: str, limit: int = 50) -> str:
-    """Build system prompt with JOIN logic for normalized schema"""
-    tables_info = discover_all_tables()
-    if not tables_info:
-        raise Exception("No tables found in database")
-    
+def _build_schema_block(tables_info: Dict[str, dict]) -> str:
     schema_blocks = []
     for table_name, info in tables_info.items():
         if table_name in TABLE_COLUMN_DEFINITIONS:
@@ -236,23 +360,15 @@ def build_dynamic_system_prompt(user_question: str, limit: int = 50) -> str:
         else:
             schema_lines = [f"Table '{table_name}' ({info['record_count']} records)"]
             for col_name, data_type, nullable in info['columns']:
-                if col_name not in ['created_at', 'updated_at']:
+                if col_name not in HIDDEN_COLUMNS:
                     examples = info['sample_data'].get(col_name, [])
                     examples_str = f" | Examples: {examples[:2]}" if examples else ""
                     schema_lines.append(f"  - {col_name}: {data_type}{examples_str}")
         schema_blocks.append("\n".join(schema_lines))
-    
-    schema_full = "\n\n".join(schema_blocks)
-    
-    system_prompt = f"""
-You are a PostgreSQL SQL generator for a NORMALIZED database schema.
-Generate ONLY a clean, valid SQL query. NO markdown, explanations, or comments.
-
-DATABASE SCHEMA:
-{schema_full}
-
-USER QUESTION: {user_question}
+    return "\n\n".join(schema_blocks)
 
+# Everything that does not depend on the question goes first so Gemini can reuse the cached prefix
+SQL_PROMPT_RULES = """
 CRITICAL RULES FOR NORMALIZED SCHEMA:
 
 1. WHEN TO USE JOIN:
@@ -266,7 +382,7 @@ CRITICAL RULES FOR NORMALIZED SCHEMA:
    INNER JOIN person_companies pc ON p.person_id = pc.person_id
    WHERE pc.company_name ILIKE '%company_name%'
    AND p.title ILIKE '%architect%'
-   LIMIT {limit}
+   LIMIT <limit>
 
 3. SIMPLE QUERIES (no JOIN needed):
    - "Find all architects in Mumbai" → Only filter unified_personnel by title and city
@@ -285,7 +401,7 @@ Q: "Find all architects in Mumbai"
 A: SELECT full_name, title, city, email, mobile
    FROM unified_personnel
    WHERE title ILIKE '%architect%' AND city ILIKE '%mumbai%'
-   LIMIT {limit}
+   LIMIT <limit>
 
 Example 2 - JOIN needed (company filter + person details):
 Q: "Find contact details of designer at Komal Azure"
@@ -293,7 +409,7 @@ A: SELECT p.full_name, p.title, p.email, p.mobile, pc.company_name
    FROM unified_personnel p
    INNER JOIN person_companies pc ON p.person_id = pc.person_id
    WHERE p.title ILIKE '%designer%' AND pc.company_name ILIKE '%komal%azure%'
-   LIMIT {limit}
+   LIMIT <limit>
 
 Example 3 - JOIN needed (person filter + company details):
 Q: "What companies does Jay Visariya work at?"
@@ -301,7 +417,7 @@ A: SELECT p.full_name, pc.company_name, pc.is_active, pc.start_date
    FROM unified_personnel p
    INNER JOIN person_companies pc ON p.person_id = pc.person_id
    WHERE p.full_name ILIKE '%jay%visariya%'
-   LIMIT {limit}
+   LIMIT <limit>
 
 Example 4 - JOIN needed (company + location):
 Q: "Find architects in Mumbai working at AllHome"
@@ -311,109 +427,294 @@ A: SELECT p.full_name, p.title, p.city, p.email, pc.company_name
    WHERE p.title ILIKE '%architect%' 
    AND p.city ILIKE '%mumbai%'
    AND pc.company_name ILIKE '%allhome%'
-   LIMIT {limit}
+   LIMIT <limit>
+"""
 
-6. ALWAYS include LIMIT {limit}
+# (schema_cache.version the prefix was built from, prefix)
+_SCHEMA_PROMPT_CACHE: Tuple[int, Optional[str]] = (-1, None)
 
-Return ONLY the SQL query.
+def _build_schema_prefix(tables_info: Dict[str, dict], schema_version: int) -> str:
+    global _SCHEMA_PROMPT_CACHE
+    cached_version, cached_prefix = _SCHEMA_PROMPT_CACHE
+    if cached_version == schema_version:
+        return cached_prefix
+    prefix = f"""
+You are a PostgreSQL SQL generator for a NORMALIZED database schema.
+Generate ONLY a clean, valid SQL query. NO markdown, explanations, or comments.
+
+DATABASE SCHEMA:
+{_build_schema_block(tables_info)}
+{SQL_PROMPT_RULES}""".rstrip() + "\n\n"
+    _SCHEMA_PROMPT_CACHE = (schema_version, prefix)
+    return prefix
+
+# The only per-request part of the prompt; everything before it is the cached schema prefix
+_QUESTION_PROMPT_TEMPLATE = """USER QUESTION: {q}
+
+6. ALWAYS include LIMIT {limit} (use it wherever the examples show <limit>)
+
+Return ONLY the SQL query, in the "sql" field.
 """
+
+def _build_question_suffix(user_question: str, limit: int) -> str:
+    return _QUESTION_PROMPT_TEMPLATE.format(q=user_question, limit=limit)
+
+async def build_dynamic_system_prompt(user_question: str, limit: int = 50) -> str:
+    """Build system prompt with JOIN logic for normalized schema"""
+    tables_info = await discover_all_tables()
+    if not tables_info:
+        raise Exception("No tables found in database")
+    
+    system_prompt = _build_schema_prefix(tables_info, schema_cache.version) + _build_question_suffix(user_question, limit)
     
     logger.debug(f"Generated system prompt for: {user_question}")
     return system_prompt
 
-def ask_gemini(prompt: str) -> str:
+# JSON mode still occasionally wraps the "sql" value in a markdown fence; strip it in one pass
+_CODE_FENCE_RE = re.compile(r'^\s*```(?:sql)?\s*|\s*```\s*$', re.IGNORECASE)
+
+async def ask_gemini(prompt: str) -> str:
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        response = model.generate_content(prompt)
+        # Native async client: concurrent calls share one channel instead of each holding a worker thread
+        response = await _GEMINI_MODEL.generate_content_async(prompt)
         if not response.text:
             raise ValueError("Empty response from Gemini")
         raw_text = response.text.strip()
         logger.info(f"Raw Gemini response: {raw_text}")
-        clean_text = re.sub(r"^```(?:sql|python)?\s*|\s*```$", "", raw_text, flags=re.MULTILINE)
-        clean_text = re.sub(r"^///.*|^--.*|^#.*", "", clean_text, flags=re.MULTILINE)
-        clean_text = re.sub(r"^\*\*.*\*\*", "", clean_text, flags=re.MULTILINE)
-        if not clean_text:
+        sql_query = _CODE_FENCE_RE.sub('', json.loads(raw_text).get('sql', '')).strip()
+        if not sql_query:
             raise ValueError("No valid SQL generated")
-        return clean_text.strip()
+        return sql_query
     except Exception as e:
         logger.error(f"Gemini API error: {str(e)}")
         raise Exception(f"Gemini API error: {str(e)}")
 
+_ALLOWED_PREFIXES = ('select', 'with')
+_FORBIDDEN_RE = re.compile(r'\b(drop|delete|update|insert|alter|truncate|grant|revoke|create)\b', re.IGNORECASE)
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+
 def validate_sql_query(sql_query: str) -> bool:
-    try:
-        parsed = sqlparse.parse(sql_query)
-        if not parsed or not parsed[0].tokens:
-            logger.error(f"Invalid SQL syntax: {sql_query}")
-            return False
-        return True
-    except Exception as e:
-        logger.error(f"SQL validation error: {str(e)}")
+    statement = sql_query.strip().rstrip(';').strip()
+    if not statement:
+        logger.error("Invalid SQL syntax: empty query")
+        return False
+    if not statement[:8].lower().startswith(_ALLOWED_PREFIXES):
+        logger.error(f"Only SELECT queries are allowed: {sql_query}")
+        return False
+    # Keywords and semicolons inside string literals (e.g. ILIKE '%update%') are data, not SQL
+    code = _STRING_LITERAL_RE.sub("''", statement)
+    if ';' in code:
+        logger.error(f"Multiple SQL statements are not allowed: {sql_query}")
+        return False
+    if _FORBIDDEN_RE.search(code):
+        logger.error(f"Data-modifying SQL is not allowed: {sql_query}")
         return False
+    logger.debug(f"Validated SQL: {statement}")
+    return True
 
-def execute_sql_query(sql_query: str):
+# The FROM/JOIN list up to the next clause keyword, parenthesis or end of statement
+_TABLE_REF_RE = re.compile(
+    r'\b(?:from|join)\s+([^();]*?)'
+    r'(?=\b(?:where|join|on|using|group|order|limit|having|union|left|right|inner|full|cross|natural)\b|[();]|$)'
+)
+
+def extract_tables_used(sql_query: str) -> List[str]:
+    """Known tables referenced after FROM/JOIN; string literals and column names are ignored"""
+    code = _STRING_LITERAL_RE.sub("''", sql_query.lower())
+    referenced = set()
+    for match in _TABLE_REF_RE.finditer(code):
+        for table_ref in match.group(1).split(','):
+            words = table_ref.split()
+            if words:
+                # Drop an alias, a schema qualifier and identifier quotes
+                referenced.add(words[0].split('.')[-1].strip('"'))
+    return sorted(_known_tables_lower & referenced)
+
+STREAM_CHUNK_SIZE = 1000
+RAW_DATA_PREVIEW_ROWS = 10
+
+async def execute_sql_query(sql_query: str, user_question: str = "", max_rows: Optional[int] = None):
+    """Stream the query through a server-side cursor, formatting each chunk as it arrives.
+    Stops after max_rows rows, even if the generated SQL has no (or a larger) LIMIT.
+    Returns (formatted_results, preview_rows, tables_used)."""
     if not validate_sql_query(sql_query):
         raise Exception("Invalid SQL query syntax")
-    conn = get_db_connection()
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(sql_query)
-        results = cursor.fetchall()
-        tables_used = []
-        tables_info = discover_all_tables()
-        for table_name in tables_info.keys():
-            if table_name.lower() in sql_query.lower():
-                tables_used.append(table_name)
-        df = pd.DataFrame([dict(row) for row in results]) if results else pd.DataFrame()
-        cursor.close()
-        conn.close()
+        formatted_results = []
+        preview_rows = []
+        chunk = []
+        rows_read = 0
+        async with get_db_connection() as conn:
+            async with conn.transaction(readonly=True):
+                async for record in conn.cursor(sql_query, prefetch=STREAM_CHUNK_SIZE):
+                    if max_rows is not None and rows_read >= max_rows:
+                        logger.warning(f"Result truncated at {max_rows} rows: {sql_query}")
+                        break
+                    rows_read += 1
+                    if len(preview_rows) < RAW_DATA_PREVIEW_ROWS:
+                        preview_rows.append(record)
+                    chunk.append(record)
+                    if len(chunk) == STREAM_CHUNK_SIZE:
+                        formatted_results.extend(format_results_intelligently(chunk, user_question))
+                        chunk = []
+        formatted_results.extend(format_results_intelligently(chunk, user_question))
+        tables_used = extract_tables_used(sql_query)
         logger.info(f"Executed SQL: {sql_query}")
-        return df, tables_used
+        return formatted_results, preview_rows, tables_used
     except Exception as e:
-        conn.close()
+        if getattr(e, 'sqlstate', None) in SCHEMA_CHANGED_SQLSTATES:
+            logger.info("Schema changed, invalidating table cache")
+            clear_tables_cache()
         logger.error(f"SQL execution error: {str(e)}")
         raise Exception(f"SQL execution error: {str(e)}")
 
-def format_results_intelligently(result_df: pd.DataFrame, user_question: str) -> List[Dict[str, Any]]:
-    if result_df.empty:
+SKIP_COLUMNS = frozenset([
+    'person_id', 'uid', 'relationship_id', 'company_id',
+    'created_at', 'updated_at', 'manager_id'
+])
+NULLISH_VALUES = frozenset(['nan', '', 'none', 'null'])
+PHONE_KEYWORDS = ('mobile', 'phone')
+# Below this many rows a plain loop beats the cost of building a DataFrame
+VECTORIZE_MIN_ROWS = 500
+
+def format_results_intelligently(rows: List[Any], user_question: str) -> List[Dict[str, Any]]:
+    """Format dicts or asyncpg Records for display"""
+    if not rows:
         return []
-
-    formatted_results = []
-    skip_columns = [
-        'person_id', 'uid', 'relationship_id', 'company_id',
-        'created_at', 'updated_at', 'manager_id'
+    # Every row of a result set has the same columns: work out what to keep once
+    keep_columns = [col for col in rows[0].keys() if col.lower() not in SKIP_COLUMNS]
+    if not keep_columns:
+        return []
+    if len(rows) >= VECTORIZE_MIN_ROWS:
+        # Drop skipped columns before the DataFrame is built, not after. dtype=object keeps each
+        # value as the driver returned it; inferred dtypes would turn an integer column with NULLs
+        # into float64 and render 5 as '5.0', unlike the loop below
+        return _format_results_vectorized(pd.DataFrame(
+            [[row[col] for col in keep_columns] for row in rows], columns=keep_columns, dtype=object
+        ))
+
+    column_specs = [
+        (col, col.replace('_', ' ').title(), any(keyword in col.lower() for keyword in PHONE_KEYWORDS))
+        for col in keep_columns
     ]
-
-    for idx, row in result_df.iterrows():
+    formatted_results = []
+    for row in rows:
         entry = {}
-        for col, value in row.items():
-            if col.lower() not in [c.lower() for c in skip_columns]:
-                if value is not None and str(value).lower() not in ['nan', '', 'none', 'null']:
-                    clean_col_name = col.replace('_', ' ').title()
-                    clean_value = str(value)
-                    if any(keyword in col.lower() for keyword in ['mobile', 'phone']):
-                        clean_value = clean_value.replace('.0', '')
-                    entry[clean_col_name] = clean_value
+        for col, clean_col_name, is_phone in column_specs:
+            value = row[col]
+            if value is None:
+                continue
+            # Most values are already text; only stringify the rest (the frontend renders strings)
+            clean_value = value if isinstance(value, str) else str(value)
+            if clean_value.lower() not in NULLISH_VALUES:
+                if is_phone:
+                    clean_value = clean_value.replace('.0', '')
+                entry[clean_col_name] = clean_value
+        if entry:
+            formatted_results.append(entry)
+
+    return formatted_results
+
+def _format_results_vectorized(values: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Vectorized formatting for large result sets; skipped columns are already dropped"""
+    keep_columns = list(values.columns)
+    text = values.astype(str)
+    null_mask = values.isna() | text.apply(lambda column: column.str.lower()).isin(list(NULLISH_VALUES))
+
+    phone_columns = [col for col in keep_columns if any(keyword in col.lower() for keyword in PHONE_KEYWORDS)]
+    for col in phone_columns:
+        text[col] = text[col].str.replace('.0', '', regex=False)
+
+    text = text.mask(null_mask)
+    text.columns = [col.replace('_', ' ').title() for col in keep_columns]
+    formatted_results = []
+    for row in text.to_dict(orient='records'):
+        entry = {col: value for col, value in row.items() if isinstance(value, str)}
         if entry:
             formatted_results.append(entry)
 
     return formatted_results
 
-def process_query(user_question: str, limit: int = 50):
+QUERY_CACHE_SIZE = 2048
+# Results go stale as data changes; generated SQL only when the schema does
+QUERY_CACHE_TTL = 60
+SQL_CACHE_TTL = 3600
+_QUESTION_WS_RE = re.compile(r'\s+')
+# (normalized question, limit) -> (sql_query, preview_rows, formatted_output, tables_used)
+_QUERY_CACHE = cachetools.TTLCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+# (normalized question, limit, schema_cache.version) -> sql_query, so expired results skip Gemini
+_SQL_CACHE = cachetools.TTLCache(maxsize=QUERY_CACHE_SIZE, ttl=SQL_CACHE_TTL)
+_query_cache_lock = asyncio.Lock()
+
+def normalize_question(user_question: str) -> str:
+    return _QUESTION_WS_RE.sub(' ', user_question.strip().lower())
+
+async def process_query(user_question: str, limit: int = 50):
+    cache_key = (normalize_question(user_question), limit)
+    async with _query_cache_lock:
+        cached = _QUERY_CACHE.get(cache_key)
+    if cached is not None:
+        logger.info(f"Query cache hit: {user_question}")
+        return cached
+    sql_cache_key = None
     try:
-        prompt = build_dynamic_system_prompt(user_question, limit)
-        sql_query = ask_gemini(prompt)
-        result_df, tables_used = execute_sql_query(sql_query)
-        formatted_output = format_results_intelligently(result_df, user_question)
+        # Refresh the schema first so the SQL cache key carries its current version
+        await discover_all_tables()
+        sql_cache_key = cache_key + (schema_cache.version,)
+        async with _query_cache_lock:
+            sql_query = _SQL_CACHE.get(sql_cache_key)
+        if sql_query is None:
+            prompt = await build_dynamic_system_prompt(user_question, limit)
+            sql_query = await ask_gemini(prompt)
+            async with _query_cache_lock:
+                _SQL_CACHE[sql_cache_key] = sql_query
+        else:
+            logger.info(f"SQL cache hit: {user_question}")
+        formatted_output, rows, tables_used = await execute_sql_query(sql_query, user_question, max_rows=limit)
         logger.info(f"Processed query: {user_question}, Results: {len(formatted_output)}")
-        return sql_query, result_df, formatted_output, tables_used
+        result = (sql_query, rows, formatted_output, tables_used)
+        async with _query_cache_lock:
+            _QUERY_CACHE[cache_key] = result
+        return result
     except Exception as e:
         logger.error(f"Error processing query '{user_question}': {str(e)}")
+        # Don't keep replaying SQL that failed to execute
+        if sql_cache_key is not None:
+            async with _query_cache_lock:
+                _SQL_CACHE.pop(sql_cache_key, None)
         return None, None, [], []
 
+# (normalized question, limit) -> task of the execution in flight; concurrent duplicates share it
+_inflight_queries: Dict[Tuple[str, int], asyncio.Task] = {}
+
+async def process_query_shared(user_question: str, limit: int = 50):
+    """Run process_query, letting identical concurrent requests wait on the one already running"""
+    key = (normalize_question(user_question), limit)
+    task = _inflight_queries.get(key)
+    if task is None:
+        task = asyncio.create_task(process_query(user_question, limit))
+        _inflight_queries[key] = task
+        task.add_done_callback(lambda _: _inflight_queries.pop(key, None))
+    else:
+        logger.info(f"Joining in-flight query: {user_question}")
+    # shield: one client disconnecting must not cancel the execution the others are waiting on
+    return await asyncio.shield(task)
+
+@app.on_event("startup")
+async def warm_prompt_prefix():
+    try:
+        tables_info = await discover_all_tables()
+        if tables_info:
+            prefix = _build_schema_prefix(tables_info, schema_cache.version)
+            await ask_gemini(prefix + "USER QUESTION: ping\nLIMIT 1")
+            logger.info("Warmed Gemini prompt prefix")
+    except Exception as e:
+        logger.warning(f"Prompt prefix warm-up failed: {str(e)}")
+
 @app.get("/")
 async def root():
     try:
-        tables_info = discover_all_tables()
+        tables_info = await discover_all_tables()
         total_records = sum(info['record_count'] for info in tables_info.values())
         return {
             "message": "Normalized CRM Query API - with JOIN support",
@@ -430,7 +731,7 @@ async def root():
 @app.get("/tables", response_model=DatabaseInfo)
 async def get_database_info():
     try:
-        tables_info = discover_all_tables()
+        tables_info = await discover_all_tables()
         total_records = sum(info['record_count'] for info in tables_info.values())
         formatted_tables = {}
         for table_name, info in tables_info.items():
@@ -454,7 +755,7 @@ async def execute_query(request: QueryRequest):
         logger.error("Empty question provided")
         raise HTTPException(status_code=400, detail="Question cannot be empty")
     try:
-        sql_query, result_df, formatted_results, tables_used = process_query(
+        sql_query, rows, formatted_results, tables_used = await process_query_shared(
             request.question, 
             request.limit or 50
         )
@@ -468,8 +769,8 @@ async def execute_query(request: QueryRequest):
                 tables_used=[]
             )
         raw_data = None
-        if request.include_raw_data and result_df is not None and not result_df.empty:
-            raw_data = result_df.head(10).to_string(index=False)
+        if request.include_raw_data and rows:
+            raw_data = pd.DataFrame.from_records(rows, columns=list(rows[0].keys())).to_string(index=False)
         logger.info(f"Query executed successfully: {request.question}")
         return QueryResponse(
             success=True,
@@ -492,7 +793,10 @@ async def execute_query(request: QueryRequest):
 @app.post("/reset-cache")
 async def reset_cache():
     try:
-        discover_all_tables.cache_clear()
+        clear_tables_cache()
+        async with _query_cache_lock:
+            _QUERY_CACHE.clear()
+            _SQL_CACHE.clear()
         logger.info("Cache cleared")
         return {"message": "Cache cleared successfully"}
     except Exception as e:
@@ -501,4 +805,8 @@ async def reset_cache():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # One worker by default: each worker is a separate process with its own schema/query caches
+    # and DB pool, so /reset-cache only clears the worker that happens to handle it
+    workers = int(os.getenv('API_WORKERS', 1))
+    # loop="auto" picks uvloop where it is installed (not available on Windows)
+    uvicorn.run("app_postgres:app", host="0.0.0.0", port=8000, workers=workers, loop="auto", http="httptools")
\ No newline at end of file
@@ -1,9 +1,12 @@
 import pandas as pd
 import psycopg2
-from psycopg2.extras import execute_batch
+from psycopg2.extras import execute_values
 import os
+import io
+import json
 import glob
 import re
+import multiprocessing
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -18,6 +21,19 @@ DB_CONFIG = {
 
 CSV_FOLDER = r"C:\Projects\Junior AI Engineer Task\Task_Assignment\schema_design"
 
+# Rows per multi-row INSERT statement in the execute_values fallback
+INSERT_PAGE_SIZE = 1000
+# Read as NULL on import, on top of pandas' default NA strings
+NULL_SENTINELS = ['nan', 'NaN', 'None', '<NA>', 'null', '']
+# Rows read from a CSV at a time; bounds memory regardless of file size
+IMPORT_CHUNK_ROWS = 50000
+# Files are imported in parallel, one process and connection each; keep well below max_connections
+MAX_IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', 4))
+# columns_info per (path, mtime, size), so unchanged CSVs are not re-analyzed on reruns
+ANALYSIS_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.csv_schema_cache.json')
+# Bump whenever analyze_csv_structure's typing rules change, so older cached analyses are ignored
+ANALYSIS_VERSION = 2
+
 # Table name mappings - MAP YOUR OUTPUT FILES HERE
 TABLE_NAME_MAPPINGS = {
     'unified_personnel': 'unified_personnel',  # Main personnel table
@@ -25,9 +41,32 @@ TABLE_NAME_MAPPINGS = {
     'unified_companies_complete': 'unified_companies',
 }
 
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9_]')
+_MULTI_UNDERSCORE_RE = re.compile(r'_+')
+
+BOOLEAN_COLUMNS = ('is_active', 'is_primary')
+INTEGER_COLUMNS = ('age', 'count', 'quantity', 'year', 'month', 'day')
+
+# Primary key for each table
+PRIMARY_KEY_MAP = {
+    'unified_personnel': 'person_id',
+    'person_companies': 'relationship_id',
+    'unified_companies': 'uid'
+}
+
+# (pattern name, column-name keywords) for create_smart_indexes
+INDEX_PATTERNS = [
+    ('name', ['name', 'full_name', 'first_name', 'company_name', 'title']),
+    ('location', ['city', 'state', 'country', 'billing_city']),
+    ('identifier', ['id', 'uid', 'person_id', 'company_id', 'relationship_id']),
+    ('contact', ['email', 'phone', 'mobile']),
+]
+
 def create_connection():
     try:
         conn = psycopg2.connect(**DB_CONFIG)
+        # Imports manage their own transactions (one per file)
+        conn.set_session(autocommit=False)
         print("Connected to PostgreSQL successfully")
         return conn
     except Exception as e:
@@ -60,8 +99,8 @@ def generate_table_name(csv_path):
         return TABLE_NAME_MAPPINGS[filename]
     
     table_name = filename.lower()
-    table_name = re.sub(r'[^a-z0-9_]', '_', table_name)
-    table_name = re.sub(r'_+', '_', table_name)
+    table_name = _NON_ALNUM_RE.sub('_', table_name)
+    table_name = _MULTI_UNDERSCORE_RE.sub('_', table_name)
     table_name = table_name.strip('_')
     
     return table_name
@@ -69,21 +108,22 @@ def generate_table_name(csv_path):
 def analyze_csv_structure(csv_path):
     """Analyze CSV and determine column types"""
     try:
-        df_sample = pd.read_csv(csv_path, nrows=100)
+        # Untyped sample read, with the same null handling as the import itself
+        df_sample = pd.read_csv(csv_path, nrows=100, dtype=str, na_values=NULL_SENTINELS)
         columns_info = {}
         
         for col in df_sample.columns:
             clean_col = col.lower().replace(' ', '_').replace('-', '_')
-            clean_col = re.sub(r'[^a-z0-9_]', '_', clean_col)
-            clean_col = re.sub(r'_+', '_', clean_col).strip('_')
+            clean_col = _NON_ALNUM_RE.sub('_', clean_col)
+            clean_col = _MULTI_UNDERSCORE_RE.sub('_', clean_col).strip('_')
             
             col_type = "TEXT"
             
             # Check for boolean
-            if col.lower() in ['is_active', 'is_primary']:
+            if col.lower() in BOOLEAN_COLUMNS:
                 col_type = "BOOLEAN"
             # Check for integer
-            elif col.lower() in ['age', 'count', 'quantity', 'year', 'month', 'day'] or 'count' in col.lower():
+            elif col.lower() in INTEGER_COLUMNS or 'count' in col.lower():
                 non_null_values = df_sample[col].dropna()
                 if len(non_null_values) > 0:
                     try:
@@ -105,22 +145,66 @@ def analyze_csv_structure(csv_path):
         print(f"Error analyzing {csv_path}: {e}")
         return {}
 
+def load_analysis_cache():
+    try:
+        with open(ANALYSIS_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # Entries from older analysis versions can never match again; drop them so the file doesn't grow
+    prefix = f"v{ANALYSIS_VERSION}:"
+    return {key: value for key, value in cache.items() if key.startswith(prefix)}
+
+def save_analysis_cache(cache):
+    try:
+        with open(ANALYSIS_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+    except OSError as e:
+        print(f"Could not save analysis cache: {e}")
+
+def analyze_csv_cached(csv_path, cache):
+    """analyze_csv_structure, reusing the cached result while the file is unchanged"""
+    stat = os.stat(csv_path)
+    key = f"v{ANALYSIS_VERSION}:{os.path.abspath(csv_path)}:{stat.st_mtime}:{stat.st_size}"
+    if key in cache:
+        return cache[key]
+    columns_info = analyze_csv_structure(csv_path)
+    if columns_info:
+        # Sample values are not needed to create or load the table
+        cache[key] = {
+            col: {k: v for k, v in info.items() if k != 'sample_values'}
+            for col, info in columns_info.items()
+        }
+    return columns_info
+
+def drop_target_tables(conn, table_names):
+    """Drop the FK and every table about to be re-imported, in one transaction.
+    Runs serially before the import pool: parallel CASCADE drops of tables linked by
+    the FK lock each other in opposite order and deadlock"""
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            ALTER TABLE IF EXISTS person_companies 
+            DROP CONSTRAINT IF EXISTS fk_person_companies_personnel;
+        """)
+        cursor.execute(f"DROP TABLE IF EXISTS {', '.join(table_names)} CASCADE;")
+        conn.commit()
+        cursor.close()
+        print(f"Dropped existing tables: {', '.join(table_names)}")
+        return True
+    except Exception as e:
+        print(f"Error dropping existing tables: {e}")
+        conn.rollback()
+        return False
+
 def create_table_from_csv_structure(conn, table_name, columns_info):
-    """Create table based on CSV structure with proper PRIMARY KEYs"""
+    """Create table based on CSV structure with proper PRIMARY KEYs (the table is already dropped)"""
     try:
         cursor = conn.cursor()
-        cursor.execute(f"DROP TABLE IF EXISTS {table_name} CASCADE;")
         
         column_definitions = []
         
-        # Define primary key for each table
-        primary_key_map = {
-            'unified_personnel': 'person_id',
-            'person_companies': 'relationship_id',
-            'unified_companies': 'uid'
-        }
-        
-        pk_column = primary_key_map.get(table_name)
+        pk_column = PRIMARY_KEY_MAP.get(table_name)
         
         for col_name, info in columns_info.items():
             col_def = f"{col_name} {info['type']}"
@@ -131,10 +215,11 @@ def create_table_from_csv_structure(conn, table_name, columns_info):
         column_definitions.append("created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
         column_definitions.append("updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
         
+        # Unlogged with autovacuum off while bulk loading; finalize_table restores both
         create_sql = f"""
-        CREATE TABLE {table_name} (
+        CREATE UNLOGGED TABLE {table_name} (
             {', '.join(column_definitions)}
-        );
+        ) WITH (autovacuum_enabled = false);
         """
         
         cursor.execute(create_sql)
@@ -149,109 +234,143 @@ def create_table_from_csv_structure(conn, table_name, columns_info):
         conn.rollback()
         return False
 
+def copy_dataframe(cursor, table_name, columns_str, df):
+    """Stream a DataFrame into a table with COPY FROM STDIN"""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep='')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table_name} ({columns_str}) FROM STDIN WITH (FORMAT CSV, NULL '')", buffer)
+
+def prepare_chunk(df, columns_info):
+    """Clean one chunk of a CSV and map it onto the table's columns"""
+    # Handle boolean columns
+    for col_name, info in columns_info.items():
+        if info['type'] == 'BOOLEAN' and info['original_name'] in df.columns:
+            df[info['original_name']] = df[info['original_name']].map({
+                'True': True, 'true': True, '1': True, 
+                'False': False, 'false': False, '0': False
+            })
+    
+    column_mapping = {info['original_name']: col_name for col_name, info in columns_info.items()}
+    df_clean = df.rename(columns=column_mapping)
+    
+    available_columns = [col for col in columns_info.keys() if col in df_clean.columns]
+    df_final = df_clean[available_columns]
+    
+    # Null sentinels in any case ('NULL', 'None', ...) would otherwise be loaded as text
+    return df_final.mask(df_final.apply(lambda col: col.astype(str).str.lower()).isin(['nan', 'none', 'null']))
+
+def import_chunk(cursor, table_name, df_final):
+    """Load one cleaned chunk with COPY, falling back to multi-row INSERTs.
+    Runs inside the caller's transaction; returns rows imported (0 if both fail)"""
+    columns_str = ', '.join(df_final.columns)
+    # A failed COPY must not abort the chunks already loaded in this transaction
+    cursor.execute("SAVEPOINT import_chunk")
+    try:
+        copy_dataframe(cursor, table_name, columns_str, df_final)
+        cursor.execute("RELEASE SAVEPOINT import_chunk")
+        return len(df_final)
+    except Exception as copy_error:
+        print(f"COPY failed, falling back to INSERT: {copy_error}")
+        cursor.execute("ROLLBACK TO SAVEPOINT import_chunk")
+    
+    insert_sql = f"INSERT INTO {table_name} ({columns_str}) VALUES %s"
+    # Sentinels are already masked; turn the remaining NaNs into None in one pass
+    data_tuples = list(map(tuple, df_final.astype(object).where(df_final.notna(), None).to_numpy()))
+    try:
+        # execute_values always sends one multi-row INSERT ... VALUES statement per page
+        execute_values(cursor, insert_sql, data_tuples, page_size=INSERT_PAGE_SIZE)
+        cursor.execute("RELEASE SAVEPOINT import_chunk")
+        return len(data_tuples)
+    except Exception as insert_error:
+        print(f"Error in batch: {insert_error}")
+        cursor.execute("ROLLBACK TO SAVEPOINT import_chunk")
+        return 0
+
 def clean_and_import_csv(conn, csv_path, table_name, columns_info):
     """Import CSV to PostgreSQL"""
     try:
         print(f"Importing {os.path.basename(csv_path)} to {table_name}")
         
-        df = pd.read_csv(csv_path)
-        print(f"Loaded {len(df)} rows")
-        
-        # Clean data
-        df = df.astype(str).replace(['nan', 'NaN', 'None', '<NA>', 'null', ''], None)
-        
-        # Handle boolean columns
-        for col_name, info in columns_info.items():
-            if info['type'] == 'BOOLEAN' and info['original_name'] in df.columns:
-                df[info['original_name']] = df[info['original_name']].map({
-                    'True': True, 'true': True, '1': True, 
-                    'False': False, 'false': False, '0': False,
-                    None: None
-                })
-        
-        column_mapping = {info['original_name']: col_name for col_name, info in columns_info.items()}
-        df_clean = df.rename(columns=column_mapping)
-        
-        available_columns = [col for col in columns_info.keys() if col in df_clean.columns]
-        df_final = df_clean[available_columns]
-        
-        placeholders = ', '.join(['%s'] * len(available_columns))
-        columns_str = ', '.join(available_columns)
-        insert_sql = f"INSERT INTO {table_name} ({columns_str}) VALUES ({placeholders})"
-        
-        data_tuples = []
-        for _, row in df_final.iterrows():
-            tuple_data = []
-            for val in row:
-                if pd.isna(val) or val is None or str(val).lower() in ['nan', 'none', 'null']:
-                    tuple_data.append(None)
-                else:
-                    tuple_data.append(str(val))
-            data_tuples.append(tuple(tuple_data))
-        
-        cursor = conn.cursor()
-        batch_size = 100
+        total_read = 0
         total_imported = 0
-        
-        for i in range(0, len(data_tuples), batch_size):
-            batch = data_tuples[i:i + batch_size]
-            try:
-                execute_batch(cursor, insert_sql, batch, page_size=batch_size)
-                conn.commit()
-                total_imported += len(batch)
-                
-                if (i // batch_size + 1) % 10 == 0 or total_imported == len(data_tuples):
-                    print(f"  Imported: {total_imported}/{len(data_tuples)} rows")
-                    
-            except Exception as batch_error:
-                print(f"Error in batch: {batch_error}")
-                conn.rollback()
+        # The whole file loads in one transaction: one commit instead of one per batch
+        cursor = conn.cursor()
+        # Read in chunks so memory stays bounded by IMPORT_CHUNK_ROWS, not the file size
+        # dtype=str keeps values as written (no '5' -> '5.0'); null sentinels become NaN at parse time
+        for chunk in pd.read_csv(csv_path, chunksize=IMPORT_CHUNK_ROWS, dtype=str, na_values=NULL_SENTINELS):
+            df_final = prepare_chunk(chunk, columns_info)
+            imported = import_chunk(cursor, table_name, df_final)
+            total_read += len(chunk)
+            total_imported += imported
+            print(f"  Imported: {total_imported}/{total_read} rows")
+            if imported < len(df_final):
                 break
         
+        conn.commit()
         cursor.close()
         print(f"Successfully imported {total_imported} rows")
         return total_imported
         
     except Exception as e:
         print(f"Error importing {csv_path}: {e}")
+        conn.rollback()
         return 0
 
+def finalize_table(conn, table_name):
+    """Make a bulk-loaded table durable again and give the planner fresh statistics.
+    Returns False if the table could not be made LOGGED"""
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"ALTER TABLE {table_name} SET LOGGED;")
+        cursor.execute(f"ALTER TABLE {table_name} RESET (autovacuum_enabled);")
+        cursor.execute(f"ANALYZE {table_name};")
+        conn.commit()
+        cursor.close()
+        return True
+    except Exception as e:
+        print(f"Error finalizing table {table_name}: {e}")
+        conn.rollback()
+        return False
+
+def drop_table(conn, table_name):
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {table_name} CASCADE;")
+        conn.commit()
+        cursor.close()
+    except Exception as e:
+        print(f"Error dropping table {table_name}: {e}")
+        conn.rollback()
+
 def create_smart_indexes(conn, table_name, columns_info):
     """Create indexes on commonly searched columns"""
     try:
         cursor = conn.cursor()
         
-        index_patterns = [
-            ('name', ['name', 'full_name', 'first_name', 'company_name', 'title']),
-            ('location', ['city', 'state', 'country', 'billing_city']),
-            ('identifier', ['id', 'uid', 'person_id', 'company_id', 'relationship_id']),
-            ('contact', ['email', 'phone', 'mobile']),
-        ]
-        
-        indexes_created = []
-        
-        for pattern_name, keywords in index_patterns:
-            matching_columns = []
+        # A column can match several patterns; index it once
+        index_columns = {}
+        for pattern_name, keywords in INDEX_PATTERNS:
             for col_name in columns_info.keys():
                 if any(keyword in col_name.lower() for keyword in keywords):
-                    matching_columns.append(col_name)
-            
-            for col in matching_columns:
-                index_name = f"idx_{table_name}_{col}"
-                try:
-                    cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name}({col});")
-                    indexes_created.append(index_name)
-                except:
-                    pass
+                    index_columns[f"idx_{table_name}_{col_name}"] = col_name
+        
+        if index_columns:
+            # All of the table's index DDL in one round-trip
+            cursor.execute("\n".join(
+                f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name}({col});"
+                for index_name, col in index_columns.items()
+            ))
         
         conn.commit()
         cursor.close()
         
-        if indexes_created:
-            print(f"Created {len(indexes_created)} indexes")
+        if index_columns:
+            print(f"Created {len(index_columns)} indexes")
         
     except Exception as e:
         print(f"Error creating indexes: {e}")
+        conn.rollback()
 
 def create_foreign_keys(conn):
     """Create foreign key relationships after all tables are loaded"""
@@ -279,32 +398,31 @@ def get_all_tables_info(conn):
     """Get database summary"""
     try:
         cursor = conn.cursor()
+        # Two round-trips for the whole schema instead of two per table
         cursor.execute("""
-            SELECT table_name 
-            FROM information_schema.tables 
+            SELECT table_name, column_name, data_type 
+            FROM information_schema.columns 
             WHERE table_schema = 'public' 
             AND table_name NOT LIKE 'pg_%'
-            ORDER BY table_name
+            AND column_name NOT IN ('created_at', 'updated_at')
+            ORDER BY table_name, ordinal_position
         """)
+        columns_by_table = {}
+        for table, column_name, data_type in cursor.fetchall():
+            columns_by_table.setdefault(table, []).append((column_name, data_type))
         
-        tables = [row[0] for row in cursor.fetchall()]
-        tables_info = {}
+        # Live-tuple estimates; finalize_table has just ANALYZEd every imported table
+        cursor.execute("""
+            SELECT relname, n_live_tup 
+            FROM pg_stat_user_tables 
+            WHERE schemaname = 'public'
+        """)
+        counts = dict(cursor.fetchall())
         
-        for table in tables:
-            cursor.execute(f"SELECT COUNT(*) FROM {table}")
-            count = cursor.fetchone()[0]
-            
-            cursor.execute(f"""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = '{table}' 
-                AND column_name NOT IN ('created_at', 'updated_at')
-                ORDER BY ordinal_position
-            """)
-            columns = cursor.fetchall()
-            
+        tables_info = {}
+        for table, columns in columns_by_table.items():
             tables_info[table] = {
-                'record_count': count,
+                'record_count': counts.get(table, 0),
                 'columns': columns
             }
         
@@ -315,6 +433,37 @@ def get_all_tables_info(conn):
         print(f"Error getting table info: {e}")
         return {}
 
+def process_one_csv(csv_path, columns_info):
+    """Create, import and index one analyzed CSV on its own connection; returns rows imported"""
+    filename = os.path.basename(csv_path)
+    print(f"\nProcessing: {filename}")
+    
+    table_name = generate_table_name(csv_path)
+    print(f"Table name: {table_name}")
+    
+    conn = create_connection()
+    if not conn:
+        return 0
+    
+    try:
+        imported_count = 0
+        if create_table_from_csv_structure(conn, table_name, columns_info):
+            imported_count = clean_and_import_csv(conn, csv_path, table_name, columns_info)
+            
+            # Even an empty table must be LOGGED before foreign keys can reference it.
+            # A table left UNLOGGED would be emptied by crash recovery, so it counts as a failed import
+            if not finalize_table(conn, table_name):
+                print(f"Import of {filename} failed: {table_name} could not be made LOGGED; dropping it")
+                drop_table(conn, table_name)
+                return 0
+            
+            # Index only after SET LOGGED, which would otherwise rewrite every index as well
+            if imported_count > 0:
+                create_smart_indexes(conn, table_name, columns_info)
+        return imported_count
+    finally:
+        conn.close()
+
 def main():
     print("Normalized Personnel & Companies Migration")
     print("=" * 50)
@@ -332,23 +481,25 @@ def main():
         
         print(f"\nProcessing {len(csv_files)} CSV files...")
         
+        # Analyze up front, in this process, so the cache file has a single writer
+        analysis_cache = load_analysis_cache()
+        jobs = []
         for csv_path in csv_files:
-            filename = os.path.basename(csv_path)
-            print(f"\nProcessing: {filename}")
-            
-            table_name = generate_table_name(csv_path)
-            print(f"Table name: {table_name}")
-            
-            columns_info = analyze_csv_structure(csv_path)
+            columns_info = analyze_csv_cached(csv_path, analysis_cache)
             if not columns_info:
-                print(f"Skipping {filename}")
+                print(f"Skipping {os.path.basename(csv_path)}")
                 continue
-            
-            if create_table_from_csv_structure(conn, table_name, columns_info):
-                imported_count = clean_and_import_csv(conn, csv_path, table_name, columns_info)
-                
-                if imported_count > 0:
-                    create_smart_indexes(conn, table_name, columns_info)
+            jobs.append((csv_path, columns_info))
+        save_analysis_cache(analysis_cache)
+        
+        # Each CSV targets its own table, so files can load side by side
+        if jobs:
+            if not drop_target_tables(conn, sorted({generate_table_name(csv_path) for csv_path, _ in jobs})):
+                print("Migration aborted: existing tables could not be dropped")
+                return
+            workers = max(1, min(len(jobs), MAX_IMPORT_WORKERS, (os.cpu_count() or 2) - 1))
+            with multiprocessing.Pool(workers) as pool:
+                pool.starmap(process_one_csv, jobs)
         
         # Create foreign keys after all tables loaded
         print("\nCreating foreign key constraints...")
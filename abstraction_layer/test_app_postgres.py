@@ -0,0 +1,28 @@
+import os
+
+os.environ.setdefault('GOOGLE_API_KEY', 'test-key')
+
+import app_postgres
+
+
+def format_both_ways(rows, monkeypatch):
+    monkeypatch.setattr(app_postgres, 'VECTORIZE_MIN_ROWS', len(rows) + 1)
+    looped = app_postgres.format_results_intelligently(rows, '')
+    monkeypatch.setattr(app_postgres, 'VECTORIZE_MIN_ROWS', 1)
+    vectorized = app_postgres.format_results_intelligently(rows, '')
+    return looped, vectorized
+
+
+def test_vectorized_formatting_matches_loop(monkeypatch):
+    rows = [
+        {'person_id': 1, 'full_name': 'Asha Rao', 'employees': 5, 'mobile': 9876543210, 'score': 1.5},
+        {'person_id': 2, 'full_name': None, 'employees': None, 'mobile': '9876543211.0', 'score': None},
+        {'person_id': 3, 'full_name': 'null', 'employees': 12, 'mobile': None, 'score': 2.0},
+    ]
+    looped, vectorized = format_both_ways(rows, monkeypatch)
+    assert vectorized == looped
+    assert looped == [
+        {'Full Name': 'Asha Rao', 'Employees': '5', 'Mobile': '9876543210', 'Score': '1.5'},
+        {'Mobile': '9876543211'},
+        {'Employees': '12', 'Score': '2.0'},
+    ]
@@ -1,17 +1,34 @@
 import requests
-import json
-# import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
 import csv     
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# Modules are independent; fetch several at once over the shared session
+MODULE_WORKERS = 8
+# Only pause between pages once the remaining quota drops to this; never for longer than the cap
+RATE_LIMIT_MIN_REMAINING = 10
+RATE_LIMIT_MAX_WAIT = 60
+
 class BiginDataExporter:
     def __init__(self, access_token: str, api_domain: str = "https://www.zohoapis.in"):
         self.access_token = access_token
         self.api_domain = api_domain
         self.headers = {"Authorization": f"Zoho-oauthtoken {access_token}", "Content-Type": "application/json"}
+        # Reuse TCP/TLS connections across pages and modules; retry transient failures
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=10, pool_maxsize=20,
+            max_retries=Retry(total=5, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+        ))
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # module name -> the v1/v2 URL that answered first, so later pages skip the probe
+        self._module_url_cache = {}
         self.output_dir = f"BiginData_{timestamp}"
         os.makedirs(self.output_dir, exist_ok=True)
         print(f"Created output directory: {self.output_dir}")
@@ -22,12 +39,17 @@ class BiginDataExporter:
         per_page = 200
         while True:
             success = False
-            for url in [f"{self.api_domain}/bigin/v1/{module_name}", f"{self.api_domain}/bigin/v2/{module_name}"]:
+            cached_url = self._module_url_cache.get(module_name)
+            candidate_urls = [cached_url] if cached_url else [
+                f"{self.api_domain}/bigin/v1/{module_name}", f"{self.api_domain}/bigin/v2/{module_name}"
+            ]
+            for url in candidate_urls:
                 try:
                     params = {"page": page, "per_page": per_page} if page > 1 else {"per_page": per_page}
-                    response = requests.get(url, headers=self.headers, params=params)
+                    response = self.session.get(url, params=params)
                     if response.status_code == 200:
                         data = response.json()
+                        self._module_url_cache[module_name] = url
                         success = True
                         break
                 except requests.RequestException:
@@ -41,35 +63,67 @@ class BiginDataExporter:
             else:
                 break
             page += 1
-            time.sleep(0.1)
+            self.wait_for_rate_limit(response)
         return all_records
 
+    def wait_for_rate_limit(self, response):
+        """Sleep until the quota resets when Zoho reports it nearly used up; 429s are retried by the session"""
+        remaining = response.headers.get("X-RATELIMIT-REMAINING")
+        reset = response.headers.get("X-RATELIMIT-RESET")
+        try:
+            if remaining is None or int(remaining) > RATE_LIMIT_MIN_REMAINING:
+                return
+            reset = float(reset)
+        except (TypeError, ValueError):
+            return
+        # The reset header is an epoch timestamp (ms or s); anything smaller is seconds from now
+        if reset > 1e12:
+            wait = reset / 1000 - time.time()
+        elif reset > 1e9:
+            wait = reset - time.time()
+        else:
+            wait = reset
+        if wait > 0:
+            time.sleep(min(wait, RATE_LIMIT_MAX_WAIT))
+
     def save_to_json(self, data, filename: str):
         filepath = os.path.join(self.output_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+        with open(filepath, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2, default=str))
 
     def save_to_csv(self, data, filename: str):
         if not data: return
         filepath = os.path.join(self.output_dir, filename)
         flattened_data = [self.flatten_dict(record) for record in data]
         all_fieldnames = sorted({k for record in flattened_data for k in record.keys()})
+        # Fixed column order, rows built up front: no DictWriter per-cell key handling
+        rows = [[record.get(k, '') for k in all_fieldnames] for record in flattened_data]
         with open(filepath, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=all_fieldnames)
-            writer.writeheader()
-            writer.writerows(flattened_data)
+            writer = csv.writer(f)
+            writer.writerow(all_fieldnames)
+            writer.writerows(rows)
 
     def flatten_dict(self, d, parent_key='', sep='_'):
-        items = []
-        for k, v in d.items():
-            new_key = f"{parent_key}{sep}{k}" if parent_key else k
-            if isinstance(v, dict):
-                items.extend(self.flatten_dict(v, new_key, sep=sep).items())
-            elif isinstance(v, list):
-                items.append((new_key, str(v)))
-            else:
-                items.append((new_key, v))
-        return dict(items)
+        # Iterative: nested dicts go on a stack and write straight into one result dict
+        flat = {}
+        stack = [(parent_key, d)]
+        while stack:
+            prefix, current = stack.pop()
+            for k, v in current.items():
+                new_key = f"{prefix}{sep}{k}" if prefix else k
+                if isinstance(v, dict):
+                    stack.append((new_key, v))
+                elif isinstance(v, list):
+                    flat[new_key] = str(v)
+                else:
+                    flat[new_key] = v
+        return flat
+
+    def export_module(self, module):
+        records = self.get_all_records_from_module(module["api_name"])
+        self.save_to_json(records, f"{module['api_name']}.json")
+        self.save_to_csv(records, f"{module['api_name']}.csv")
+        return len(records)
 
     def export_all_data(self):
         modules = [
@@ -87,12 +141,8 @@ class BiginDataExporter:
             {"api_name": "Deals", "label": "Deals"}
         ]
 
-        total_records = 0
-        for module in modules:
-            records = self.get_all_records_from_module(module["api_name"])
-            self.save_to_json(records, f"{module['api_name']}.json")
-            self.save_to_csv(records, f"{module['api_name']}.csv")
-            total_records += len(records)
+        with ThreadPoolExecutor(max_workers=MODULE_WORKERS) as executor:
+            total_records = sum(executor.map(self.export_module, modules))
 
         summary_file = os.path.join(self.output_dir, "Export_Summary.txt")
         with open(summary_file, 'w', encoding='utf-8') as f:
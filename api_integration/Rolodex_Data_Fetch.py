@@ -1,20 +1,8 @@
 import os
-import requests
-import json
-from dotenv import load_dotenv
-
-load_dotenv()
-
-API_KEY = os.getenv("ROLODEX_API_KEY")
-BASE_URL = os.getenv("ROLODEX_BASE_URL")
-
-if not API_KEY or not BASE_URL:
-    raise ValueError("ROLODEX_API_KEY or ROLODEX_BASE_URL missing in .env")
-
-headers = {
-    "Content-Type": "application/json",
-    "x-rolodex-api-key": API_KEY
-}
+import asyncio
+import orjson
+import math
+from rolodex_client import BASE_URL, PageFetchError, create_client, get_with_retry
 
 # Updated endpoints with include parameters for relationship data
 endpoints = {
@@ -36,27 +24,40 @@ endpoints = {
 output_folder = "rolodex_complete_data"
 os.makedirs(output_folder, exist_ok=True)
 
-def fetch_multiple_pages(endpoint_url, endpoint_name, pages=3, limit=100):
+async def fetch_page(client, endpoint_url, endpoint_name, limit, offset):
+    """Fetch one page; raises PageFetchError if it cannot be fetched"""
+    # Add pagination parameters to the existing endpoint URL
+    if "?" in endpoint_url:
+        url = f"{BASE_URL.rstrip('/')}/{endpoint_url}&limit={limit}&offset={offset}"
+    else:
+        url = f"{BASE_URL.rstrip('/')}/{endpoint_url}?limit={limit}&offset={offset}"
+        
+    print(f"Fetching: {url}")
+    
+    response = await get_with_retry(client, url)
+    if response.status_code != 200:
+        raise PageFetchError(f"{endpoint_name} at offset {offset}: {response.status_code} - {response.text}")
+    return response.json()
+
+async def fetch_multiple_pages(client, endpoint_url, endpoint_name, pages=3, limit=100):
     """Fetch multiple pages of data with proper include parameters"""
     all_records = []
     
-    for page in range(pages):
-        offset = page * limit
-        
-        # Add pagination parameters to the existing endpoint URL
-        if "?" in endpoint_url:
-            url = f"{BASE_URL.rstrip('/')}/{endpoint_url}&limit={limit}&offset={offset}"
-        else:
-            url = f"{BASE_URL.rstrip('/')}/{endpoint_url}?limit={limit}&offset={offset}"
-            
-        print(f"Fetching: {url}")
-        
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            print(f"Error fetching {endpoint_name} at offset {offset}: {response.status_code} - {response.text}")
-            break
-            
-        data = response.json()
+    # The first page tells us the total, so the rest can be requested in parallel
+    first = await fetch_page(client, endpoint_url, endpoint_name, limit, 0)
+    responses = [first]
+    if len(first.get("data", [])) >= limit:
+        total = first.get("pagination", {}).get("total")
+        page_count = pages if total is None else min(pages, math.ceil(total / limit))
+        # get_with_retry bounds how many requests are in flight; a failed page fails the endpoint
+        responses += await asyncio.gather(*(
+            fetch_page(client, endpoint_url, endpoint_name, limit, page * limit)
+            for page in range(1, page_count)
+        ), return_exceptions=True)
+    
+    for page, data in enumerate(responses):
+        if isinstance(data, BaseException):
+            raise data
         records = data.get("data", [])
         total = data.get("pagination", {}).get("total", len(records))
         
@@ -70,18 +71,18 @@ def fetch_multiple_pages(endpoint_url, endpoint_name, pages=3, limit=100):
     return all_records
 
 
-for endpoint_name, endpoint_url in endpoints.items():
+async def export_endpoint(client, endpoint_name, endpoint_url):
     print(f"\n{'='*50}")
     print(f"Fetching COMPLETE data for: {endpoint_name}")
     print(f"{'='*50}")
     
     try:
-        records = fetch_multiple_pages(endpoint_url, endpoint_name, pages=3)
+        records = await fetch_multiple_pages(client, endpoint_url, endpoint_name, pages=3)
         
         # Save to file
         output_file = os.path.join(output_folder, f"{endpoint_name}.json")
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(records, f, indent=4, ensure_ascii=False)
+        with open(output_file, "wb") as f:
+            f.write(orjson.dumps(records, option=orjson.OPT_INDENT_2))
         
         print(f" Saved {len(records)} COMPLETE records to {output_file}")
         
@@ -97,8 +98,24 @@ for endpoint_name, endpoint_url in endpoints.items():
             if 'companies' in sample_contact and sample_contact['companies']:
                 print(f"  - Company example: {sample_contact['companies'][0]}")
                 
+        return True
+        
     except Exception as e:
-        print(f" Error processing {endpoint_name}: {str(e)}")
+        print(f" ERROR: {endpoint_name} not saved, its data would be incomplete: {str(e)}")
+        return False
+
+async def export_all_endpoints():
+    # Endpoints run side by side over one client; a failed endpoint doesn't stop the others
+    async with create_client() as client:
+        results = await asyncio.gather(*(
+            export_endpoint(client, endpoint_name, endpoint_url)
+            for endpoint_name, endpoint_url in endpoints.items()
+        ))
+    failed = [name for name, ok in zip(endpoints, results) if not ok]
+    if failed:
+        print(f"\n ERROR: failed endpoints (not saved): {', '.join(failed)}")
+
+asyncio.run(export_all_endpoints())
 
 print(f"\n Data fetching complete! Check the '{output_folder}' folder.")
 print(f"The contacts.json file should now have the company relationships that were missing!")
@@ -108,8 +125,8 @@ def verify_relationships():
     """Quick check to see if we got the relationship data"""
     contacts_file = os.path.join(output_folder, "contacts.json")
     if os.path.exists(contacts_file):
-        with open(contacts_file, 'r', encoding='utf-8') as f:
-            contacts = json.load(f)
+        with open(contacts_file, 'rb') as f:
+            contacts = orjson.loads(f.read())
         
         if contacts:
             contact_with_company = None
@@ -1,20 +1,8 @@
 import os
-import requests
-import json
-from dotenv import load_dotenv
-
-load_dotenv()
-
-API_KEY = os.getenv("ROLODEX_API_KEY")
-BASE_URL = os.getenv("ROLODEX_BASE_URL")
-
-if not API_KEY or not BASE_URL:
-    raise ValueError("ROLODEX_API_KEY or ROLODEX_BASE_URL missing in .env")
-
-headers = {
-    "Content-Type": "application/json",
-    "x-rolodex-api-key": API_KEY
-}
+import asyncio
+import orjson
+import math
+from rolodex_client import BASE_URL, PageFetchError, create_client, get_with_retry
 
 
 endpoints = [
@@ -31,29 +19,54 @@ endpoints = [
 output_folder = "rolodex_data"
 os.makedirs(output_folder, exist_ok=True)
 
-def fetch_all_records(endpoint):
-    all_records = []
-    offset = 0
+async def fetch_page(client, endpoint, limit, offset):
+    url = f"{BASE_URL.rstrip('/')}/{endpoint}?limit={limit}&offset={offset}"
+    response = await get_with_retry(client, url)
+    if response.status_code != 200:
+        raise PageFetchError(f"{endpoint} at offset {offset}: {response.status_code} - {response.text}")
+    return response.json()
+
+async def fetch_all_records(client, endpoint):
     limit = 100  
-    while True:
-        url = f"{BASE_URL.rstrip('/')}/{endpoint}?limit={limit}&offset={offset}"
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            print(f"Error fetching {endpoint} at offset {offset}: {response.text}")
-            break
-        data = response.json()
+    data = await fetch_page(client, endpoint, limit, 0)
+    all_records = list(data.get("data", []))
+    total = data.get("pagination", {}).get("total", len(all_records))
+    print(f"Fetched {len(all_records)}/{total} records for {endpoint}")
+    
+    # The first page gives the total: queue every remaining page; get_with_retry bounds how many are in flight.
+    # Any page that still fails raises PageFetchError, so a partial result is never saved as complete
+    offsets = range(limit, math.ceil(total / limit) * limit, limit)
+    pages = await asyncio.gather(
+        *(fetch_page(client, endpoint, limit, offset) for offset in offsets),
+        return_exceptions=True
+    )
+    for data in pages:
+        if isinstance(data, BaseException):
+            raise data
         all_records.extend(data.get("data", []))
-        total = data.get("pagination", {}).get("total", len(all_records))
-        offset += limit
         print(f"Fetched {len(all_records)}/{total} records for {endpoint}")
-        if offset >= total:
-            break
     return all_records
 
-for ep in endpoints:
+async def export_endpoint(client, ep):
+    """Fetch and save one endpoint; returns False (and writes nothing) if any page failed"""
     print(f"\nFetching all records for endpoint: {ep}")
-    records = fetch_all_records(ep)
+    try:
+        records = await fetch_all_records(client, ep)
+    except Exception as e:
+        print(f"ERROR: {ep} not saved, its data would be incomplete: {e}")
+        return False
     output_file = os.path.join(output_folder, f"{ep}.json")
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(records, f, indent=4, ensure_ascii=False)
+    with open(output_file, "wb") as f:
+        f.write(orjson.dumps(records, option=orjson.OPT_INDENT_2))
     print(f"Saved {len(records)} records to {output_file}")
+    return True
+
+async def export_all_endpoints():
+    # Endpoints run side by side over one client; a failed endpoint doesn't stop the others
+    async with create_client() as client:
+        results = await asyncio.gather(*(export_endpoint(client, ep) for ep in endpoints))
+    failed = [ep for ep, ok in zip(endpoints, results) if not ok]
+    if failed:
+        print(f"\nERROR: failed endpoints (not saved): {', '.join(failed)}")
+
+asyncio.run(export_all_endpoints())
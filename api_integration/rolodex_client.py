@@ -0,0 +1,65 @@
+import os
+import asyncio
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+API_KEY = os.getenv("ROLODEX_API_KEY")
+BASE_URL = os.getenv("ROLODEX_BASE_URL")
+
+if not API_KEY or not BASE_URL:
+    raise ValueError("ROLODEX_API_KEY or ROLODEX_BASE_URL missing in .env")
+
+headers = {
+    "Content-Type": "application/json",
+    "x-rolodex-api-key": API_KEY
+}
+
+# Statuses worth retrying with backoff; httpx itself only retries failed connects
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = 0.2
+# Upper bound on a server-requested Retry-After wait, in seconds
+RETRY_AFTER_MAX = 60
+# In-flight requests share one pooled AsyncClient
+MAX_CONNECTIONS = 20
+# Requests in flight across all endpoints; below MAX_CONNECTIONS so none waits for a pool slot
+PAGE_WORKERS = 8
+
+_request_slots = asyncio.Semaphore(PAGE_WORKERS)
+
+class PageFetchError(Exception):
+    """A page could not be fetched, so the endpoint's data would be incomplete"""
+
+def retry_delay(response, attempt):
+    """Seconds to wait before retrying: the server's Retry-After if given, else exponential backoff"""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0), RETRY_AFTER_MAX)
+        except ValueError:
+            pass  # HTTP-date form; fall back to backoff
+    return RETRY_BACKOFF * 2 ** attempt
+
+async def get_with_retry(client, url):
+    for attempt in range(MAX_ATTEMPTS):
+        response = None
+        try:
+            async with _request_slots:
+                response = await client.get(url)
+        except httpx.TransportError:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_ATTEMPTS - 1:
+                return response
+        await asyncio.sleep(retry_delay(response, attempt))
+
+def create_client():
+    return httpx.AsyncClient(
+        headers=headers,
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS),
+        transport=httpx.AsyncHTTPTransport(retries=3),
+        timeout=30.0
+    )
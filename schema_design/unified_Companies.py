@@ -1,51 +1,40 @@
 import os
+import sys
 import json
+import orjson
 import pandas as pd
 import uuid
+import itertools
+import multiprocessing
+from pathlib import Path
+from collections import deque
 from typing import Dict, List, Any, Optional, Tuple
 import re
 
-def safe_get_value(record: Dict[str, Any], path: str) -> Optional[Any]:
-    if not path or not record:
-        return None
-    try:
-        if '.split' in path:
-            base_path, op = path.split('.split', 1)
-            value = safe_get_value(record, base_path)
-            if value is None:
-                return None
-            match = re.match(r"\(', '\)\[\s*(\d+)\s*\]", op)
-            if match:
-                index = int(match.group(1))
-                parts = value.split(', ')
-                return parts[index] if len(parts) > index else None
-            return None
-        else:
-            keys = path.split('.')
-            current = record
-            for key in keys:
-                if isinstance(current, dict) and key in current:
-                    current = current[key]
-                else:
-                    return None
-            return current if current not in [None, '', []] else None
-    except:
-        return None
+# Folder holding mapper/, Raw_Data/ and the output CSV; defaults to this script's folder
+DATA_ROOT = Path(os.getenv('DATA_ROOT', Path(__file__).resolve().parent))
+
+# Short strings (cities, states, types, ...) repeat across records; intern them to share one object
+INTERN_MAX_LEN = 64
+
+# Index in a mapper path like "field.split(', ')[1]"
+_SPLIT_INDEX_RE = re.compile(r"\(', '\)\[\s*(\d+)\s*\]")
+
+def rolodex_match_key(rec: Dict) -> Optional[str]:
+    """The value records are matched on, or None if the record has no rolodex_company_id"""
+    rolodex_id = rec.get('rolodex_company_id')
+    return str(rolodex_id).strip() if rolodex_id else None
 
 def exact_rolodex_id_match(rec1: Dict, rec2: Dict) -> bool:
     """Match records based on rolodex_company_id (the proper way!)"""
-    id1 = rec1.get('rolodex_company_id')
-    id2 = rec2.get('rolodex_company_id')
-    
+    key1 = rolodex_match_key(rec1)
     # Both must have valid IDs and they must match
-    if not id1 or not id2:
-        return False
-    return str(id1).strip() == str(id2).strip()
+    return key1 is not None and key1 == rolodex_match_key(rec2)
 
-def load_data_file(file_path: str) -> List[Dict[str, Any]]:
+def load_data_file(file_path: Path) -> List[Dict[str, Any]]:
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        with open(file_path, 'rb') as f:
+            data = orjson.loads(f.read())
         if isinstance(data, list):
             return data
         elif isinstance(data, dict) and 'data' in data:
@@ -57,67 +46,135 @@ def load_data_file(file_path: str) -> List[Dict[str, Any]]:
 
 def find_matches_by_rolodex_id(list1: List[Dict], list2: List[Dict]) -> List[Tuple[int, int]]:
     """Find matches using rolodex_company_id instead of company names"""
+    # Hash join: index list2 by key once, then probe once per list1 record (O(N+M), not O(N*M)).
+    # Each list1 record takes the first still-unused list2 record with its key.
+    index: Dict[str, deque] = {}
+    for j, rec2 in enumerate(list2):
+        key = rolodex_match_key(rec2)
+        if key is not None:
+            index.setdefault(key, deque()).append(j)
+    
     matches = []
-    used2 = set()
     for i, rec1 in enumerate(list1):
-        for j, rec2 in enumerate(list2):
-            if j in used2:
-                continue
-            if exact_rolodex_id_match(rec1, rec2):
-                matches.append((i, j))
-                used2.add(j)
-                break
+        key = rolodex_match_key(rec1)
+        candidates = index.get(key) if key is not None else None
+        if candidates:
+            matches.append((i, candidates.popleft()))
     return matches
 
 def merge_records(rec1: Dict, rec2: Dict, id_keys: List[str]) -> Dict:
-    merged = rec1.copy()
+    # rec1's non-null values win; rec2 fills the gaps (company_id always comes from rec1)
+    merged = rec2 | {field: value for field, value in rec1.items() if value is not None}
     merged['data_source'] = f"{rec1['data_source']}+{rec2['data_source']}"
     
     for key in id_keys:
         if rec2.get(key):
             merged[key] = rec2[key]
-    
-    for field, value in rec2.items():
-        if field in ['company_id', 'data_source'] or field in id_keys:
-            continue
-        if merged.get(field) is None and value is not None:
-            merged[field] = value
+        elif key in rec1:
+            merged[key] = rec1[key]
+        else:
+            merged.pop(key, None)
     return merged
 
-def create_unified_company(record: Dict, mappings: Dict, source_config: Dict) -> Dict:
+# (unified field, keys to walk in the record or None if unmapped, split(', ') index or None)
+MappingPlan = List[Tuple[str, Optional[Tuple[str, ...]], Optional[int]]]
+
+def build_plan(mappings: Dict, source_config: Dict) -> MappingPlan:
+    """Resolve every field's mapper path for one source once, instead of once per record"""
+    source_name = source_config['name']
+    plan = []
+    for field, mapping in mappings.items():
+        if field in ['company_id', 'data_source']:
+            continue
+        
+        path = mapping.get(source_name)
+        keys, split_index = None, None
+        if path:
+            if source_name == 'Rolodex':
+                path = path.replace('companies.', '')
+            elif 'Bigin' in source_name:
+                path = path.replace('Accounts.', '')
+        if path:
+            if '.split' in path:
+                base_path, op = path.split('.split', 1)
+                match = _SPLIT_INDEX_RE.match(op)
+                if match:
+                    keys, split_index = tuple(base_path.split('.')), int(match.group(1))
+            else:
+                keys = tuple(path.split('.'))
+        plan.append((field, keys, split_index))
+    return plan
+
+def resolve_path(record: Dict[str, Any], keys: Tuple[str, ...]) -> Optional[Any]:
+    """Walk a pre-split mapper path; missing or empty ('' / []) values come back as None"""
+    current = record
+    for key in keys:
+        if isinstance(current, dict) and key in current:
+            current = current[key]
+        else:
+            return None
+    return current if current not in [None, '', []] else None
+
+def create_unified_company(record: Dict, plan: MappingPlan, source_config: Dict, company_id: str) -> Dict:
     source_name = source_config['name']
     
     unified = {
-        'company_id': str(uuid.uuid4()),
+        'company_id': company_id,
         'data_source': source_name,
     }
     
     # Set the proper ID fields based on source
+    record_id = record.get('id')
+    record_id = str(record_id) if record_id not in [None, '', []] else None
     if source_name == 'Rolodex':
-        unified['rolodex_id'] = str(safe_get_value(record, 'id'))
+        unified['rolodex_id'] = record_id
     elif 'Bigin' in source_name:
         bigin_key = f"{source_name.lower().replace('bigin', '_bigin')}_id"
-        unified[bigin_key] = str(safe_get_value(record, 'id'))
+        unified[bigin_key] = record_id
     
-    for field, mapping in mappings.items():
-        if field in ['company_id', 'data_source']:
-            continue
-        
-        path = mapping.get(source_name)
+    # Several fields can index into the same split value (headquarters_location); split it once
+    splits = {}
+    for field, keys, split_index in plan:
         value = None
-        
-        if path:
-            if source_name == 'Rolodex':
-                clean_path = path.replace('companies.', '') if 'companies.' in path else path
-            elif 'Bigin' in source_name:
-                clean_path = path.replace('Accounts.', '') if 'Accounts.' in path else path
+        if keys is not None:
+            if split_index is None:
+                value = resolve_path(record, keys)
             else:
-                clean_path = path
-            value = safe_get_value(record, clean_path)
-        
+                parts = splits.get(keys)
+                if parts is None:
+                    base = resolve_path(record, keys)
+                    parts = splits[keys] = base.split(', ') if isinstance(base, str) else []
+                value = parts[split_index] if len(parts) > split_index else None
+            if isinstance(value, str) and len(value) < INTERN_MAX_LEN:
+                value = sys.intern(value)
         unified[field] = value
     return unified
 
+def load_source(config: Dict, plan: MappingPlan, raw_dir: Path, id_prefix: str) -> List[Dict]:
+    """Load one source file and unify its records; runs in a worker process"""
+    path = raw_dir / config['dir'] / config['file']
+    counter = itertools.count()
+    return [create_unified_company(rec, plan, config, f"{id_prefix}-{next(counter):08x}")
+            for rec in load_data_file(path) if rec]
+
+def merge_lists(current: List[Dict], next_list: List[Dict], id_keys: List[str]) -> List[Dict]:
+    """Merge matched pairs in current's order, then append next_list's unmatched records"""
+    match_map = dict(find_matches_by_rolodex_id(current, next_list))
+    matched_next = set(match_map.values())
+    
+    new_current = []
+    for i, rec in enumerate(current):
+        n_idx = match_map.get(i)
+        if n_idx is not None:
+            new_current.append(merge_records(rec, next_list[n_idx], id_keys))
+        else:
+            new_current.append(rec)
+    
+    for i, rec in enumerate(next_list):
+        if i not in matched_next:
+            new_current.append(rec)
+    return new_current
+
 def chain_merge_by_rolodex_id(group_lists: List[Tuple[str, List[Dict]]], id_keys: List[str]) -> List[Dict]:
     """Chain merge using rolodex_company_id matching"""
     if not group_lists:
@@ -125,32 +182,11 @@ def chain_merge_by_rolodex_id(group_lists: List[Tuple[str, List[Dict]]], id_keys
     
     current = group_lists[0][1]
     for _, next_list in group_lists[1:]:
-        matches = find_matches_by_rolodex_id(current, next_list)
-        new_current = []
-        matched_next = set()
-        
-        for i, rec in enumerate(current):
-            found = False
-            for c_idx, n_idx in matches:
-                if c_idx == i:
-                    merged = merge_records(rec, next_list[n_idx], id_keys)
-                    new_current.append(merged)
-                    matched_next.add(n_idx)
-                    found = True
-                    break
-            if not found:
-                new_current.append(rec)
-        
-        for i, rec in enumerate(next_list):
-            if i not in matched_next:
-                new_current.append(rec)
-        
-        current = new_current
+        current = merge_lists(current, next_list, id_keys)
     return current
 
-def unify_companies(source_configs: List[Dict]):
-    base_dir = r"C:\Projects\Junior AI Engineer Task\Task_assignment\schema_design"
-    mapper_path = os.path.join(base_dir, "mapper", "Unified_Companies_mapper.json")
+def unify_companies(source_configs: List[Dict], sort_output: bool = True):
+    mapper_path = DATA_ROOT / "mapper" / "Unified_Companies_mapper.json"
     
     try:
         with open(mapper_path, 'r', encoding='utf-8') as f:
@@ -174,6 +210,16 @@ def unify_companies(source_configs: List[Dict]):
     ordered_types = ['bigin', 'rolodex']
     combined = None
     total_records = 0
+    # One random prefix per run plus a per-source counter keeps ids unique without a uuid4 per record
+    run_prefix = uuid.uuid4().hex[:8]
+    
+    # Sources are independent until the merge, so load and unify them in parallel processes
+    load_configs = [c for c in source_configs if c['type'] in ordered_types]
+    jobs = [(c, build_plan(mappings, c), DATA_ROOT / "Raw_Data", f"{run_prefix}-{i}") for i, c in enumerate(load_configs)]
+    if not jobs:
+        return
+    with multiprocessing.Pool(max(1, min(len(jobs), os.cpu_count() or 1))) as pool:
+        loaded = dict(zip((c['name'] for c in load_configs), pool.starmap(load_source, jobs)))
 
     for source_type in ordered_types:
         type_configs = [c for c in source_configs if c['type'] == source_type]
@@ -182,9 +228,7 @@ def unify_companies(source_configs: List[Dict]):
         
         type_lists = []
         for config in type_configs:
-            path = os.path.join(base_dir, "Raw_Data", config['dir'], config['file'])
-            records = load_data_file(path)
-            unified = [create_unified_company(rec, mappings, config) for rec in records if rec]
+            unified = loaded[config['name']]
             total_records += len(unified)
             type_lists.append((config['name'], unified))
             print(f"Loaded {len(unified)} records from {config['name']}")
@@ -194,41 +238,18 @@ def unify_companies(source_configs: List[Dict]):
         if combined is None:
             combined = combined_type
         else:
-            matches = find_matches_by_rolodex_id(combined, combined_type)
-            new_combined = []
-            matched_type = set()
-            
-            for i, rec in enumerate(combined):
-                found = False
-                for c_idx, t_idx in matches:
-                    if c_idx == i:
-                        merged = merge_records(rec, combined_type[t_idx], all_id_keys)
-                        new_combined.append(merged)
-                        matched_type.add(t_idx)
-                        found = True
-                        break
-                if not found:
-                    new_combined.append(rec)
-            
-            for i, rec in enumerate(combined_type):
-                if i not in matched_type:
-                    new_combined.append(rec)
-            
-            combined = new_combined
+            combined = merge_lists(combined, combined_type, all_id_keys)
 
     if combined:
         schema_columns = list(mappings.keys())
         final_columns = ['company_id'] + [col for col in schema_columns if col != 'company_id'] + [key for key in all_id_keys if key not in schema_columns]
         
-        df = pd.DataFrame(combined)
-        for col in final_columns:
-            if col not in df.columns:
-                df[col] = None
-        
-        df = df[final_columns]
-        df = df.sort_values(['data_source', 'company_name'], na_position='last')
+        # Selects and orders the columns while building, filling absent ones with nulls
+        df = pd.DataFrame.from_records(combined, columns=final_columns)
+        if sort_output:
+            df = df.sort_values(['data_source', 'company_name'], na_position='last')
         
-        output_path = os.path.join(base_dir, "unified_companies.csv")
+        output_path = DATA_ROOT / "unified_companies.csv"
         df.to_csv(output_path, index=False)
         print(f"Saved {len(df)} unified company records to {output_path}")
         print(f"Processed {total_records} total records with {len(df)} final unified records")
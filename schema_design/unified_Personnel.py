@@ -1,12 +1,29 @@
 import os
 import json
+import orjson
 import pandas as pd
 import uuid
 import re
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple, Any
 import phonenumbers
 from phonenumbers import PhoneNumberFormat, NumberParseException
-import networkx as nx
+
+# Index in a mapper path like "field.split(', ')[1]"
+_SPLIT_INDEX_RE = re.compile(r"\(', '\)\[\s*(\d+)\s*\]")
+
+COUNTRY_CODE_MAP = {
+    'india': 'IN', 'united states': 'US', 'united kingdom': 'GB',
+    'canada': 'CA', 'australia': 'AU'
+}
+
+# phonenumbers cannot parse input without a digit ("N/A", "-", ...), so skip it up front
+_DIGIT_RE = re.compile(r'\d')
+
+# Job title clean-up
+_PARENTHESIZED_RE = re.compile(r'\([^)]*\)')
+_BRACKETED_RE = re.compile(r'\[[^\]]*\]')
+_WHITESPACE_RE = re.compile(r'\s+')
 
 def load_config(base_dir: str) -> Dict:
     config_path = os.path.join(base_dir, "config", "name_processing_config.json")
@@ -27,98 +44,134 @@ def load_config(base_dir: str) -> Dict:
             "company_indicators": ["ltd", "pvt", "llc", "inc", "corp"]
         }
 
-def safe_get_value(record: Dict, path: str) -> Any:
-    """Generic path extractor that handles arrays with [*] notation"""
-    if not path or not record:
-        return None
-   
-    try:
-        # Handle [*] for all array elements
-        if '[*]' in path:
-            parts = path.split('[*]')
-            base_path = parts[0]
-            
-            # Get the base array
-            current = record
-            for part in base_path.split('.'):
-                if not part:
-                    continue
-                if isinstance(current, dict) and part in current:
-                    current = current[part]
-                else:
-                    return None
-            
-            # Extract from all array elements
-            if not isinstance(current, list):
-                return None
-            
-            # Get field from each element
-            field_path = parts[1].lstrip('.')
-            results = []
-            for item in current:
-                if field_path:
-                    val = safe_get_value(item, field_path)
-                else:
-                    val = item
-                if val:
-                    results.append(val)
-            return results if results else None
-        
-        # Handle .split() for location parsing
-        if '.split' in path:
-            base_path, op = path.split('.split', 1)
-            value = safe_get_value(record, base_path)
-            if value is None:
+def build_compiled_patterns(config: Dict) -> Dict:
+    """Compile the config's title/honorific/suffix patterns once per run"""
+    # One alternation per prefix list; alternatives are tried in config order, so the
+    # first listed pattern still wins, and each title pattern gets its own group
+    title_patterns, titles = [], []
+    for category, data in config.get("title_prefixes", {}).items():
+        for pattern in data.get("patterns", []):
+            title_patterns.append(f'({re.escape(pattern)})')
+            titles.append(data.get("title", ""))
+    honorifics = [re.escape(h) for h in config.get("honorifics_to_remove", [])]
+    return {
+        'title_re': re.compile(rf'^(?:{"|".join(title_patterns)})\s+', re.IGNORECASE) if title_patterns else None,
+        'titles': titles,
+        'honorific_re': re.compile(rf'^(?:{"|".join(honorifics)})\s+', re.IGNORECASE) if honorifics else None,
+        # Suffixes are stripped one after another (e.g. "jr" then "iii"), so they stay separate
+        'suffixes': [re.compile(rf'\s+{re.escape(s)}\s*$', re.IGNORECASE) for s in config.get("suffixes_to_remove", [])],
+    }
+
+# A mapper path parsed once per source:
+#   ('path', ((key or None, list index or None), ...))   e.g. emails[0].email_address
+#   ('each', base keys, item path or None)               e.g. emails[*].email_address
+#   ('split', base path, index)                          e.g. location.split(', ')[1]
+#   ('none',)                                            never resolves
+NO_PATH = ('none',)
+
+def compile_path(path: str) -> Tuple:
+    """Parse a mapper path into the steps resolve_path walks"""
+    if not path:
+        return NO_PATH
+    
+    # Handle [*] for all array elements
+    if '[*]' in path:
+        parts = path.split('[*]')
+        base_keys = tuple(part for part in parts[0].split('.') if part)
+        field_path = parts[1].lstrip('.')
+        return ('each', base_keys, compile_path(field_path) if field_path else None)
+    
+    # Handle .split() for location parsing
+    if '.split' in path:
+        base_path, op = path.split('.split', 1)
+        match = _SPLIT_INDEX_RE.match(op)
+        if match:
+            return ('split', compile_path(base_path), int(match.group(1)))
+    
+    # Standard path navigation, with [n] list indexes
+    steps = []
+    for part in path.split('.'):
+        if '[' in part and part.endswith(']'):
+            base, index_str = part.split('[', 1)
+            index_str = index_str.rstrip(']')
+            if not index_str.isdigit():
+                return NO_PATH
+            steps.append((base or None, int(index_str)))
+        else:
+            steps.append((part, None))
+    return ('path', tuple(steps))
+
+def _get_nested(record: Any, steps: Tuple) -> Any:
+    current = record
+    for key, index in steps:
+        if key is not None:
+            if isinstance(current, dict) and key in current:
+                current = current[key]
+            else:
                 return None
-            match = re.match(r"\(', '\)\[\s*(\d+)\s*\]", op)
-            if match:
-                index = int(match.group(1))
-                parts = str(value).split(', ')
-                return parts[index] if len(parts) > index else None
-        
-        # Standard path navigation
-        current = record
-        for part in path.split('.'):
-            if '[' in part and part.endswith(']'):
-                base, index_str = part.split('[', 1)
-                index_str = index_str.rstrip(']')
-                if base:
-                    if isinstance(current, dict) and base in current:
-                        current = current[base]
-                    else:
-                        return None
-                if index_str.isdigit():
-                    index = int(index_str)
-                    if isinstance(current, list) and 0 <= index < len(current):
-                        current = current[index]
-                    else:
-                        return None
-                else:
-                    return None
+        if index is not None:
+            if isinstance(current, list) and index < len(current):
+                current = current[index]
             else:
-                if isinstance(current, dict) and part in current:
-                    current = current[part]
-                else:
-                    return None
-        
-        return current if current not in [None, '', []] else None
-    except:
+                return None
+    
+    if current is None or current == '' or current == []:
         return None
+    return current
+
+def _get_each(record: Dict, base_keys: Tuple, item_path: Optional[Tuple]) -> Optional[List]:
+    current = record
+    for key in base_keys:
+        if isinstance(current, dict) and key in current:
+            current = current[key]
+        else:
+            return None
+    
+    # Extract from all array elements
+    if not isinstance(current, list):
+        return None
+    results = []
+    for item in current:
+        val = resolve_path(item, item_path) if item_path else item
+        if val:
+            results.append(val)
+    return results if results else None
+
+def _get_split(record: Dict, base_path: Tuple, index: int) -> Optional[str]:
+    value = resolve_path(record, base_path)
+    if value is None:
+        return None
+    parts = str(value).split(', ')
+    return parts[index] if len(parts) > index else None
+
+def resolve_path(record: Dict, path: Tuple) -> Any:
+    """Generic path extractor over a compiled path; empty values ('' / []) come back as None"""
+    if not record:
+        return None
+    kind = path[0]
+    if kind == 'path':
+        return _get_nested(record, path[1])
+    if kind == 'each':
+        return _get_each(record, path[1], path[2])
+    if kind == 'split':
+        return _get_split(record, path[1], path[2])
+    return None
 
 def normalize_phone(phone: str, country: str = None, config: Dict = None) -> Optional[str]:
     if not phone:
         return None
     phone = str(phone).strip()
-    if not phone:
+    if not phone or not _DIGIT_RE.search(phone):
         return None
     default_country = config.get("default_country", "IN") if config else "IN"
-    country_code_map = {
-        'india': 'IN', 'united states': 'US', 'united kingdom': 'GB',
-        'canada': 'CA', 'australia': 'AU'
-    }
     region_code = default_country
     if country:
-        region_code = country_code_map.get(country.lower().strip(), default_country)
+        region_code = COUNTRY_CODE_MAP.get(country.lower().strip(), default_country)
+    return _parse_and_format(phone, region_code)
+
+@lru_cache(maxsize=65536)
+def _parse_and_format(phone: str, region_code: str) -> Optional[str]:
+    """E.164 form of a phone number, cached because the same numbers recur across sources"""
     try:
         parsed_number = phonenumbers.parse(phone, region_code)
         if phonenumbers.is_valid_number(parsed_number):
@@ -127,7 +180,7 @@ def normalize_phone(phone: str, country: str = None, config: Dict = None) -> Opt
         pass
     return None
 
-def clean_name_and_extract_title(name: str, config: Dict) -> Tuple[str, Optional[str]]:
+def clean_name_and_extract_title(name: str, patterns: Dict) -> Tuple[str, Optional[str]]:
     if not name or not isinstance(name, str):
         return "", None
    
@@ -135,37 +188,28 @@ def clean_name_and_extract_title(name: str, config: Dict) -> Tuple[str, Optional
     if not name:
         return "", None
    
-    title_prefixes = config.get("title_prefixes", {})
-    for category, data in title_prefixes.items():
-        patterns = data.get("patterns", [])
-        title = data.get("title", "")
-       
-        for pattern in patterns:
-            regex = rf'^{re.escape(pattern)}\s+'
-            if re.match(regex, name, re.IGNORECASE):
-                clean_name = re.sub(regex, '', name, flags=re.IGNORECASE).strip()
-                if clean_name:
-                    return clean_name, title
-   
-    honorifics = config.get("honorifics_to_remove", [])
-    for honorific in honorifics:
-        regex = rf'^{re.escape(honorific)}\s+'
-        if re.match(regex, name, re.IGNORECASE):
-            name = re.sub(regex, '', name, flags=re.IGNORECASE).strip()
-            break
-   
-    suffixes = config.get("suffixes_to_remove", [])
-    for suffix in suffixes:
-        regex = rf'\s+{re.escape(suffix)}\s*$'
-        name = re.sub(regex, '', name, flags=re.IGNORECASE).strip()
+    title_re = patterns['title_re']
+    match = title_re.match(name) if title_re else None
+    if match:
+        clean_name = name[match.end():].strip()
+        if clean_name:
+            return clean_name, patterns['titles'][match.lastindex - 1]
+   
+    honorific_re = patterns['honorific_re']
+    match = honorific_re.match(name) if honorific_re else None
+    if match:
+        name = name[match.end():].strip()
+   
+    for regex in patterns['suffixes']:
+        name = regex.sub('', name).strip()
    
     return name, None
 
-def process_names(first_name: str, last_name: str, full_name: str, config: Dict) -> Dict:
+def process_names(first_name: str, last_name: str, full_name: str, patterns: Dict) -> Dict:
     result = {'first_name': None, 'last_name': None, 'full_name': None, 'inferred_title': None}
    
     if full_name and str(full_name).strip():
-        clean_full, title = clean_name_and_extract_title(full_name, config)
+        clean_full, title = clean_name_and_extract_title(full_name, patterns)
         if clean_full:
             parts = clean_full.split()
             if len(parts) >= 2:
@@ -177,8 +221,8 @@ def process_names(first_name: str, last_name: str, full_name: str, config: Dict)
             result['inferred_title'] = title
    
     if not result['full_name']:
-        clean_first, title_first = clean_name_and_extract_title(first_name or '', config)
-        clean_last, title_last = clean_name_and_extract_title(last_name or '', config)
+        clean_first, title_first = clean_name_and_extract_title(first_name or '', patterns)
+        clean_last, title_last = clean_name_and_extract_title(last_name or '', patterns)
        
         result['first_name'] = clean_first if clean_first else None
         result['last_name'] = clean_last if clean_last else None
@@ -224,9 +268,9 @@ def clean_job_title(title: str) -> Optional[str]:
     title = title.split(' at ')[0]
     title = title.split(' |')[0]
     title = title.split('|')[0]
-    title = re.sub(r'\([^)]*\)', '', title)
-    title = re.sub(r'\[[^\]]*\]', '', title)
-    title = re.sub(r'\s+', ' ', title).strip()
+    title = _PARENTHESIZED_RE.sub('', title)
+    title = _BRACKETED_RE.sub('', title)
+    title = _WHITESPACE_RE.sub(' ', title).strip()
    
     return title if title else None
 
@@ -286,26 +330,6 @@ def extract_company_relationships(raw_record: Dict, person_id: str, source_name:
     
     return relationships
 
-def simple_person_match(rec1: Dict, rec2: Dict) -> bool:
-    """
-    CRITICAL: Match ONLY by rolodex_id.
-    Same name does NOT mean same person - MUST have matching IDs.
-    Different IDs = different people, even if names match.
-    """
-    rolodex_id1 = rec1.get('rolodex_id')
-    rolodex_id2 = rec2.get('rolodex_id')
-
-    # Never match if different non-null rolodex_ids
-    if rolodex_id1 and rolodex_id2 and str(rolodex_id1) != str(rolodex_id2):
-        return False
-
-    # Match if same rolodex_id (non-null)
-    if rolodex_id1 and rolodex_id2 and str(rolodex_id1) == str(rolodex_id2):
-        return True
-
-    # No match - cannot link by IDs
-    return False
-
 def merge_records(records: List[Dict], mappings: Dict) -> Dict:
     """Merge records that matched by ID"""
     if len(records) == 1:
@@ -379,27 +403,33 @@ def merge_company_relationships(relationships: List[Dict]) -> List[Dict]:
     return merged
 
 def find_matches(records: List[Dict]) -> List[List[Dict]]:
-    """Find matching records using graph-based clustering"""
-    G = nx.Graph()
-    for i, rec in enumerate(records):
-        G.add_node(i)
-   
-    for i in range(len(records)):
-        for j in range(i + 1, len(records)):
-            if simple_person_match(records[i], records[j]):
-                G.add_edge(i, j)
-   
+    """
+    CRITICAL: Match ONLY by rolodex_id.
+    Same name does NOT mean same person - MUST have matching IDs.
+    Records without a rolodex_id are never merged.
+    """
+    # Matching is exact equality, so one pass of hash buckets gives the same groups
+    # as comparing every pair; groups come out in order of their first record
     groups = []
-    for component in nx.connected_components(G):
-        group = [records[idx] for idx in component]
-        groups.append(group)
+    by_rolodex_id = {}
+    for rec in records:
+        rolodex_id = rec.get('rolodex_id')
+        if not rolodex_id:
+            groups.append([rec])
+            continue
+        key = str(rolodex_id)
+        group = by_rolodex_id.get(key)
+        if group is None:
+            group = by_rolodex_id[key] = []
+            groups.append(group)
+        group.append(rec)
    
     return groups
 
 def load_data(file_path: str) -> List[Dict]:
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        with open(file_path, 'rb') as f:
+            data = orjson.loads(f.read())
         return data if isinstance(data, list) else data.get('data', [])
     except:
         return []
@@ -414,35 +444,41 @@ def load_mapper(base_dir: str) -> Dict:
         print(f"Error loading mapper: {e}")
         return {}
 
-def create_unified_record(raw_record: Dict, mappings: Dict, source_name: str, config: Dict) -> Tuple[Optional[Dict], List[Dict]]:
+def compile_mapping(mappings: Dict, source_name: str) -> List[Tuple[str, str, Optional[Tuple], bool]]:
+    """Per-field (field, 'system' / 'null' / 'path', compiled path, is_array) plan for one source"""
+    plan = []
+    for field, field_config in mappings.items():
+        source_path = field_config.get(source_name)
+        if source_path == 'system generated':
+            plan.append((field, 'system', None, False))
+        elif source_path in [None, 'null', 'computed']:
+            plan.append((field, 'null', None, False))
+        else:
+            is_array = field_config.get('type', 'string') == 'array'
+            plan.append((field, 'path', compile_path(source_path), is_array))
+    return plan
+
+def create_unified_record(raw_record: Dict, plan: List[Tuple[str, str, Optional[Tuple], bool]], source_name: str, config: Dict, patterns: Dict) -> Tuple[Optional[Dict], List[Dict]]:
     """Create unified personnel record AND extract company relationships"""
     
     unified = {}
    
-    # Process each field from Unified_Personnel mapper
-    for field, field_config in mappings.items():
-        source_path = field_config.get(source_name)
-       
-        if source_path == 'system generated':
+    # Process each field from the source's compiled Unified_Personnel mapping
+    for field, kind, path, is_array in plan:
+        if kind == 'system':
             if field == 'person_id':
                 unified[field] = str(uuid.uuid4())
             elif field == 'data_source':
                 unified[field] = source_name
             continue
        
-        if source_path == 'computed':
+        if kind == 'null':
             unified[field] = None
             continue
        
-        if source_path is None or source_path == 'null':
-            unified[field] = None
-            continue
-       
-        value = safe_get_value(raw_record, source_path)
-       
-        field_type = field_config.get('type', 'string')
+        value = resolve_path(raw_record, path)
        
-        if field_type == 'array':
+        if is_array:
             if isinstance(value, list):
                 unified[field] = value
             elif value:
@@ -457,7 +493,7 @@ def create_unified_record(raw_record: Dict, mappings: Dict, source_name: str, co
         unified.get('first_name', ''),
         unified.get('last_name', ''),
         unified.get('full_name', ''),
-        config
+        patterns
     )
     unified['first_name'] = name_result['first_name']
     unified['last_name'] = name_result['last_name']
@@ -511,6 +547,7 @@ def main():
     base_dir = r"C:\Projects\Junior AI Engineer Task\Task_Assignment\schema_design"
    
     config = load_config(base_dir)
+    patterns = build_compiled_patterns(config)
     mapper_data = load_mapper(base_dir)
    
     if not mapper_data:
@@ -539,11 +576,12 @@ def main():
        
         file_path = os.path.join(base_dir, "Raw_Data", source['dir'], source['file'])
         raw_data = load_data(file_path)
+        plan = compile_mapping(personnel_mappings, source['name'])
        
         valid_count = 0
         for raw_record in raw_data:
             person_record, company_rels = create_unified_record(
-                raw_record, personnel_mappings, source['name'], config
+                raw_record, plan, source['name'], config, patterns
             )
             if person_record:
                 all_personnel_records.append(person_record)